@@ -0,0 +1,89 @@
+"""
+Shared Client Helpers for the Integration Tests
+================================================
+
+Used by test_e2e_full.py, test_signed_auth.py and test_signed_auth_fixed.py,
+which all talk to a running step15 server:
+- Keep-alive HTTP sessions
+- JSON request/response bodies (orjson when installed)
+- Device keypairs from fixed seeds and signed download requests
+"""
+
+import base64
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from nacl.signing import SigningKey
+    HAS_NACL = True
+except ImportError:
+    HAS_NACL = False
+
+
+def new_session():
+    """Create a Session that keeps connections to the server alive between calls"""
+    sess = requests.Session()
+    sess.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=0))
+    sess.headers["Connection"] = "keep-alive"
+    return sess
+
+
+# orjson (C extension) is optional; falls back to requests' stdlib json
+try:
+    import orjson
+
+    _JSON_HEADERS = {"Content-Type": "application/json"}
+
+    def post_json(sess, url, payload):
+        """POST payload as a JSON request body"""
+        return sess.post(url, data=orjson.dumps(payload), headers=_JSON_HEADERS)
+
+    def read_json(r):
+        """Parse a JSON response body"""
+        return orjson.loads(r.content)
+except ImportError:
+    def post_json(sess, url, payload):
+        """POST payload as a JSON request body"""
+        return sess.post(url, json=payload)
+
+    def read_json(r):
+        """Parse a JSON response body"""
+        return r.json()
+
+
+def seeded_key(seed):
+    """
+    Device keypair from a fixed test seed (reproducible runs, no CSPRNG reads)
+
+    Args:
+        seed: int - Byte value repeated to form the 32-byte Ed25519 seed
+
+    Returns:
+        tuple: (SigningKey, base64 public key), or (None, None) without PyNaCl
+    """
+    if not HAS_NACL:
+        return None, None
+    key = SigningKey(bytes([seed]) * 32)
+    return key, base64.b64encode(key.verify_key.encode()).decode('utf-8')
+
+
+def sign_requests(key, targets):
+    """
+    Sign download requests for (file_id, user_id) pairs with one reused key
+
+    Returns:
+        list: (timestamp, raw signature bytes) per target, in order
+    """
+    sign = key.sign
+    timestamp = int(time.time())
+    return [
+        (timestamp, sign(f"{file_id}:{user_id}:{timestamp}".encode('utf-8')).signature)
+        for file_id, user_id in targets
+    ]
+
+
+def sign_request(key, file_id, user_id):
+    """Sign a download request; returns (timestamp, raw signature bytes)"""
+    return sign_requests(key, [(file_id, user_id)])[0]
@@ -0,0 +1,57 @@
+"""
+Block Data Cache for the Storage Classes
+=========================================
+
+Shared by step7, step9 and step12: memoized parsing of block data and of
+the ECC-encrypted AES key each block holds.
+"""
+
+from step3_crypto_ecc import ECCEncryption
+from step5_blockchain_structure import loads_block_data
+
+
+class BlockDataCacheMixin:
+    """
+    Memoized decoding of block data for the storage classes
+    
+    The class using it sets self._parse_cache = {} and, if it decrypts
+    keys, self._key_data_cache = {} (both block_id -> (block.data, value)).
+    """
+    
+    def _parsed(self, block):
+        """
+        Return block.data parsed as JSON, memoized per block
+        
+        The cached entry is only reused while block.data is the same string
+        it was parsed from.
+        
+        Args:
+            block: Block - Block whose data to parse
+            
+        Returns:
+            dict: Parsed block data (treat as read-only)
+        """
+        cached = self._parse_cache.get(block.block_id)
+        if cached is None or cached[0] is not block.data:
+            cached = (block.data, loads_block_data(block.data))
+            self._parse_cache[block.block_id] = cached
+        return cached[1]
+    
+    def _encrypted_key_data(self, block):
+        """
+        Return the ECC-encrypted AES key in a block, decoded and memoized
+        
+        Saves the JSON parse and base64/hex decoding of the key fields on
+        every download and share of the same file.
+        
+        Args:
+            block: Block - Block holding the encrypted key
+            
+        Returns:
+            dict: Input for ECCEncryption.decrypt_data (treat as read-only)
+        """
+        cached = self._key_data_cache.get(block.block_id)
+        if cached is None or cached[0] is not block.data:
+            cached = (block.data, ECCEncryption.unpack_encrypted_data(self._parsed(block)))
+            self._key_data_cache[block.block_id] = cached
+        return cached[1]
@@ -22,6 +22,11 @@ SERVER_ACCOUNT_INDEX = 0
 # Gas limit for transactions
 GAS_LIMIT = 3000000
 
+# Pooled Web3 connections for parallel block submissions
+# (each one sends from its own Ganache account, so at most 10 are used)
+WEB3_POOL_SIZE = min(os.cpu_count() or 1, 8)
+WEB3_POOL_TIMEOUT = 30  # Seconds to wait for a free pooled connection
+
 # ============================================================================
 # CRYPTOGRAPHY CONFIGURATION
 # ============================================================================
@@ -35,6 +40,10 @@ AES_MODE = 'GCM'  # Galois/Counter Mode for authenticated encryption
 ECC_CURVE = 'secp256k1'
 
 # Hash Algorithm
+# File content hash used for key derivation: 'sha256' (paper default) or
+# 'blake3' (faster on large files, requires the blake3 package).
+# Block hashes always use SHA-256. Changing this for an existing blockchain
+# changes the keys it derives, so keep it fixed once files are stored.
 HASH_ALGORITHM = 'sha256'
 
 # ============================================================================
@@ -71,6 +80,9 @@ BLOCK_FIELDS = {
     'owner': str
 }
 
+# Blocks appended to a chain's journal before it is compacted into the JSON snapshot
+CHAIN_LOG_COMPACT_BLOCKS = 256
+
 # ============================================================================
 # FILE SHARING SETTINGS
 # ============================================================================
@@ -81,6 +93,10 @@ MAX_BRANCHES = 100
 # Shared file prefix for branch identification
 SHARED_FILE_PREFIX = "shared_"
 
+# Seconds an ECDH secret is reused for repeated shares to the same recipient
+# (0 disables reuse; shares wrapped with one secret carry the same ephemeral key)
+SHARE_SECRET_TTL = 60
+
 # ============================================================================
 # SYSTEM SETTINGS
 # ============================================================================
@@ -91,6 +107,9 @@ DEBUG = True
 # Maximum file size (in bytes) - 100 MB
 MAX_FILE_SIZE = 100 * 1024 * 1024
 
+# Decrypted AES keys kept in memory per user session (least recently used evicted)
+KEY_CACHE_SIZE = 128
+
 # Supported file types (empty list means all types allowed)
 SUPPORTED_FILE_TYPES = []  # ['.txt', '.pdf', '.docx', '.jpg', '.png']
 
@@ -137,6 +156,21 @@ def get_file_path(file_id, encrypted=False):
     directory = ENCRYPTED_DIR if encrypted else FILES_DIR
     return directory / file_id
 
+def list_encrypted_file_ids():
+    """
+    Get the IDs of all stored encrypted files
+    
+    One directory scan instead of an exists() stat per file; scandir's
+    entry types come from the directory listing itself.
+    
+    Returns:
+        set of file ID strings
+    """
+    with os.scandir(ENCRYPTED_DIR) as entries:
+        # Dotfiles are uploads still being encrypted, not stored files
+        return {entry.name for entry in entries
+                if entry.is_file() and not entry.name.startswith('.')}
+
 # ============================================================================
 # DISPLAY CONFIGURATION
 # ============================================================================
@@ -8,7 +8,7 @@ This demo includes:
 - Better UI for shared files
 """
 
-from step9_improved_sharing import SecureCloudStorage
+from step9_improved_sharing import SecureCloudStorage, load_share_records
 import config
 from pathlib import Path
 
@@ -255,14 +255,11 @@ class ImprovedDemoApp:
         print("\n📊 SHARING HISTORY")
         print("-" * 80)
         
-        shares_path = config.DATA_DIR / 'shares.json'
-        if not shares_path.exists():
+        shares = load_share_records()
+        if not shares:
             print("No sharing history yet")
             return
         
-        with open(shares_path, 'r') as f:
-            shares = __import__('json').load(f)
-        
         # Filter for current user
         my_shares_sent = [s for s in shares if s['sender'] == self.current_user]
         my_shares_received = [s for s in shares if s['recipient'] == self.current_user]
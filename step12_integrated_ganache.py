@@ -16,12 +16,14 @@ import json
 from step2_crypto_aes import AESEncryption
 from step3_crypto_ecc import ECCEncryption
 from step4_dynamic_key_gen import DynamicKeyGenerator
-from step5_blockchain_structure import Blockchain, Block
+from step5_blockchain_structure import Blockchain, Block, dumps_block_data
+from block_data_cache import BlockDataCacheMixin
 from step10_full_ganache import GanacheBlockchain
+from step9_improved_sharing import append_share_record
 import config
 
 
-class SecureCloudStorageWithGanache:
+class SecureCloudStorageWithGanache(BlockDataCacheMixin):
     """
     Complete system with automatic Ganache integration
     
@@ -47,6 +49,8 @@ class SecureCloudStorageWithGanache:
         self.ganache = None
         self.acl_contract = None
         self.ganache_enabled = False
+        self._parse_cache = {}  # block_id -> (block.data, parsed dict)
+        self._key_data_cache = {}  # block_id -> (block.data, decoded encrypted key)
         
         # Load or create ECC keys
         self.private_key, self.public_key = self.ecc.load_keys(user_id)
@@ -65,11 +69,24 @@ class SecureCloudStorageWithGanache:
             self.blockchain.create_genesis_block()
             self.blockchain.save_to_file()
             print(f"🔗 Created new blockchain for {user_id}")
+        self._chain_stamp = self._blockchain_file_stamp()
         
         # Try to connect to Ganache
         if use_ganache:
             self._init_ganache()
     
+    def _blockchain_file_stamp(self):
+        """Change marker for our saved blockchain (see Blockchain.file_stamp)"""
+        return Blockchain.file_stamp(config.get_blockchain_path(self.user_id))
+    
+    def _refresh_blockchain(self):
+        """Reload blockchain if another session (e.g. a share) has written it"""
+        stamp = self._blockchain_file_stamp()
+        if stamp is not None and stamp != self._chain_stamp:
+            self.blockchain = Blockchain.load_from_file(config.get_blockchain_path(self.user_id))
+            self._chain_stamp = stamp
+            print(f"🔄 Reloaded blockchain with {len(self.blockchain)} blocks")
+    
     def _init_ganache(self):
         """Initialize Ganache connection if available"""
         try:
@@ -161,7 +178,8 @@ class SecureCloudStorageWithGanache:
             file_data = f.read()
         print(f"✅ Read file: {len(file_data)} bytes")
         
-        # Get latest block
+        # Get latest block (from disk if a share has added one since we loaded)
+        self._refresh_blockchain()
         latest_block = self.blockchain.get_latest_block()
         latest_block_content = latest_block.to_dict()
         print(f"✅ Got latest block: #{latest_block.block_id}")
@@ -170,51 +188,37 @@ class SecureCloudStorageWithGanache:
         dynamic_key = self.keygen.generate_dynamic_key(file_data, latest_block_content)
         print(f"✅ Generated dynamic key")
         
-        # Encrypt file with AES
-        encrypted_file_data = self.aes.encrypt_file(file_data, dynamic_key)
-        print(f"✅ Encrypted file with AES-256-GCM")
-        
         # Generate unique file ID
         file_id = str(uuid.uuid4())
         
-        # Save encrypted file
+        # Encrypt file with AES straight into its binary container
         encrypted_file_path = config.get_file_path(file_id, encrypted=True)
-        encrypted_file_bundle = {
-            'ciphertext': encrypted_file_data['ciphertext'].hex(),
-            'nonce': encrypted_file_data['nonce'].hex(),
-            'tag': encrypted_file_data['tag'].hex(),
-            'original_name': file_path.name
-        }
-        
-        with open(encrypted_file_path, 'w') as f:
-            json.dump(encrypted_file_bundle, f)
+        self.aes.encrypt_file_to(file_data, dynamic_key, encrypted_file_path, file_path.name)
+        print(f"✅ Encrypted file with AES-256-GCM")
         print(f"✅ Saved encrypted file")
         
         # Encrypt the AES key with ECC public key
         encrypted_key_data = self.ecc.encrypt_data(dynamic_key, self.public_key)
         
-        # Convert to JSON-serializable format
+        # Convert to JSON-serializable format (base64 key fields)
         block_data = {
-            'ciphertext': encrypted_key_data['ciphertext'].hex(),
-            'nonce': encrypted_key_data['nonce'].hex(),
-            'tag': encrypted_key_data['tag'].hex(),
-            'encrypted_key': encrypted_key_data['encrypted_key'].hex(),
-            'key_nonce': encrypted_key_data['key_nonce'].hex(),
-            'key_tag': encrypted_key_data['key_tag'].hex(),
-            'ephemeral_public_key': encrypted_key_data['ephemeral_public_key'].hex(),
+            **ECCEncryption.pack_encrypted_data(encrypted_key_data),
             'is_shared': False,
-            'owner': self.user_id
+            'owner': self.user_id,
+            'original_name': file_path.name
         }
         
         # Add block to LOCAL blockchain
         new_block = self.blockchain.add_block(
-            data=json.dumps(block_data),
+            data=dumps_block_data(block_data),
             file_id=file_id
         )
+        self._key_data_cache[new_block.block_id] = (new_block.data, encrypted_key_data)
         print(f"✅ Created block #{new_block.block_id}")
         
-        # Save LOCAL blockchain
-        self.blockchain.save_to_file()
+        # Save LOCAL blockchain (appends just the new block)
+        self.blockchain.append_block_to_disk(new_block)
+        self._chain_stamp = self._blockchain_file_stamp()
         print(f"✅ Saved to local blockchain")
         
         # Store on GANACHE (if enabled)
@@ -256,62 +260,38 @@ class SecureCloudStorageWithGanache:
             raise ValueError(f"File not found: {file_id}")
         print(f"✅ Found block #{block.block_id}")
         
-        # Decrypt block to get AES key
-        block_data = json.loads(block.data)
-        
-        encrypted_key_data = {
-            'ciphertext': bytes.fromhex(block_data['ciphertext']),
-            'nonce': bytes.fromhex(block_data['nonce']),
-            'tag': bytes.fromhex(block_data['tag']),
-            'encrypted_key': bytes.fromhex(block_data['encrypted_key']),
-            'key_nonce': bytes.fromhex(block_data['key_nonce']),
-            'key_tag': bytes.fromhex(block_data['key_tag']),
-            'ephemeral_public_key': bytes.fromhex(block_data['ephemeral_public_key'])
-        }
+        # Decrypt block to get AES key (decoded key fields are memoized)
+        encrypted_key_data = self._encrypted_key_data(block)
         
         dynamic_key = self.ecc.decrypt_data(encrypted_key_data, self.private_key)
         print(f"✅ Decrypted AES key from block")
         
-        # Load encrypted file
+        # Read encrypted file header (the ciphertext is streamed below)
         encrypted_file_path = config.get_file_path(file_id, encrypted=True)
-        with open(encrypted_file_path, 'r') as f:
-            encrypted_file_bundle = json.load(f)
-        
-        # Decrypt file
-        encrypted_file_data = {
-            'ciphertext': bytes.fromhex(encrypted_file_bundle['ciphertext']),
-            'nonce': bytes.fromhex(encrypted_file_bundle['nonce']),
-            'tag': bytes.fromhex(encrypted_file_bundle['tag'])
-        }
+        header = AESEncryption.load_encrypted_header(encrypted_file_path)
         
-        decrypted_data = self.aes.decrypt_file(encrypted_file_data, dynamic_key)
-        print(f"✅ Decrypted file: {len(decrypted_data)} bytes")
-        
-        # Save decrypted file
         if output_path is None:
-            output_path = config.FILES_DIR / encrypted_file_bundle['original_name']
+            output_path = config.FILES_DIR / header['original_name']
         else:
             output_path = Path(output_path)
         
-        with open(output_path, 'wb') as f:
-            f.write(decrypted_data)
+        # Decrypt into the output file
+        size = self.aes.decrypt_file_to(encrypted_file_path, dynamic_key, output_path, header)
+        print(f"✅ Decrypted file: {size} bytes")
         print(f"✅ Saved to: {output_path}")
         
         return output_path
     
     def list_files(self, include_shared=True):
         """List all files"""
-        # Force reload blockchain to get latest data
-        blockchain_path = config.get_blockchain_path(self.user_id)
-        if blockchain_path.exists():
-            self.blockchain = Blockchain.load_from_file(blockchain_path)
-            print(f"🔄 Reloaded blockchain with {len(self.blockchain)} blocks")
+        self._refresh_blockchain()
         
         files = []
+        existing = config.list_encrypted_file_ids()
         
         for block in self.blockchain.chain[1:]:  # Skip genesis
             try:
-                block_data = json.loads(block.data)
+                block_data = self._parsed(block)
                 is_shared = block_data.get('is_shared', False)
                 shared_from = block_data.get('shared_from', None)
                 
@@ -322,19 +302,26 @@ class SecureCloudStorageWithGanache:
                 file_found = False
                 original_name = f"file_{block.file_id}"
                 
-                if encrypted_path.exists():
-                    with open(encrypted_path, 'r') as f:
-                        bundle = json.load(f)
-                    original_name = bundle.get('original_name', f"file_{block.file_id}")
+                # Blocks carry the file name; older ones need the encrypted file's header
+                block_name = block_data.get('original_name')
+                
+                if block.file_id in existing:
+                    if block_name is not None:
+                        original_name = block_name
+                    else:
+                        bundle = AESEncryption.load_encrypted_header(encrypted_path)
+                        original_name = bundle.get('original_name', f"file_{block.file_id}")
                     file_found = True
                 else:
                     # For shared files, the encrypted file might be in the original owner's directory
                     # Try to find it in the main encrypted directory
                     main_encrypted_path = config.ENCRYPTED_DIR / block.file_id
-                    if main_encrypted_path.exists():
-                        with open(main_encrypted_path, 'r') as f:
-                            bundle = json.load(f)
-                        original_name = bundle.get('original_name', f"file_{block.file_id}")
+                    if main_encrypted_path.name in existing:
+                        if block_name is not None:
+                            original_name = block_name
+                        else:
+                            bundle = AESEncryption.load_encrypted_header(main_encrypted_path)
+                            original_name = bundle.get('original_name', f"file_{block.file_id}")
                         file_found = True
                     else:
                         print(f"⚠️  Encrypted file not found for {block.file_id}")
@@ -375,16 +362,8 @@ class SecureCloudStorageWithGanache:
         if not block:
             raise ValueError(f"File not found: {file_id}")
         
-        block_data = json.loads(block.data)
-        encrypted_key_data = {
-            'ciphertext': bytes.fromhex(block_data['ciphertext']),
-            'nonce': bytes.fromhex(block_data['nonce']),
-            'tag': bytes.fromhex(block_data['tag']),
-            'encrypted_key': bytes.fromhex(block_data['encrypted_key']),
-            'key_nonce': bytes.fromhex(block_data['key_nonce']),
-            'key_tag': bytes.fromhex(block_data['key_tag']),
-            'ephemeral_public_key': bytes.fromhex(block_data['ephemeral_public_key'])
-        }
+        block_data = self._parsed(block)
+        encrypted_key_data = self._encrypted_key_data(block)
         
         aes_key = self.ecc.decrypt_data(encrypted_key_data, self.private_key)
         print(f"✅ Retrieved AES key")
@@ -396,18 +375,14 @@ class SecureCloudStorageWithGanache:
         )
         
         shared_block_data = {
-            'ciphertext': shared_key_data['ciphertext'].hex(),
-            'nonce': shared_key_data['nonce'].hex(),
-            'tag': shared_key_data['tag'].hex(),
-            'encrypted_key': shared_key_data['encrypted_key'].hex(),
-            'key_nonce': shared_key_data['key_nonce'].hex(),
-            'key_tag': shared_key_data['key_tag'].hex(),
-            'ephemeral_public_key': shared_key_data['ephemeral_public_key'].hex(),
+            **ECCEncryption.pack_encrypted_data(shared_key_data),
             'is_shared': True,
             'shared_from': self.user_id,
             'original_file_id': file_id,
             'owner': recipient_user_id
         }
+        if 'original_name' in block_data:
+            shared_block_data['original_name'] = block_data['original_name']
         
         print(f"✅ Encrypted key for recipient")
         
@@ -416,7 +391,7 @@ class SecureCloudStorageWithGanache:
         print(f"🔍 DEBUG: Shared block data: {shared_block_data}")
         
         new_block = recipient_storage.blockchain.add_block(
-            data=json.dumps(shared_block_data),
+            data=dumps_block_data(shared_block_data),
             file_id=file_id
         )
         
@@ -424,7 +399,7 @@ class SecureCloudStorageWithGanache:
         print(f"🔍 DEBUG: Block data: {new_block.data}")
         
         # Save recipient's LOCAL blockchain
-        recipient_storage.blockchain.save_to_file()
+        recipient_storage.blockchain.append_block_to_disk(new_block)
         print(f"✅ Added to {recipient_user_id}'s local blockchain (Block #{new_block.block_id})")
         
         # Store on GANACHE if enabled
@@ -441,17 +416,7 @@ class SecureCloudStorageWithGanache:
             'ganache_synced': recipient_storage.ganache_enabled
         }
         
-        shares_path = config.DATA_DIR / 'shares.json'
-        if shares_path.exists():
-            with open(shares_path, 'r') as f:
-                shares = json.load(f)
-        else:
-            shares = []
-        
-        shares.append(share_record)
-        
-        with open(shares_path, 'w') as f:
-            json.dump(shares, f, indent=2)
+        append_share_record(share_record)
         
         print(f"✅ File successfully shared!")
         
@@ -34,13 +34,16 @@ import os
 import json
 from pathlib import Path
 import socket
+import threading
 from datetime import timedelta
 import uuid
 import base64
+import functools
 import time
 
 # Import existing modules
 import config
+from step2_crypto_aes import AESEncryption
 from step12_integrated_ganache import SecureCloudStorageWithGanache
 
 # For Ed25519 signature verification
@@ -51,7 +54,30 @@ try:
 except ImportError:
     HAS_NACL = False
 
+# orjson (C extension) is optional; Flask's stdlib json provider is used without it
+try:
+    import orjson
+    from flask.json.provider import DefaultJSONProvider
+
+    class OrjsonProvider(DefaultJSONProvider):
+        """Flask JSON provider backed by orjson"""
+
+        def dumps(self, obj, **kwargs):
+            try:
+                return orjson.dumps(obj, default=self.default,
+                                    option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+            except TypeError:
+                # orjson.JSONEncodeError: e.g. wei amounts wider than 64 bits
+                return super().dumps(obj, **kwargs)
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+except ImportError:
+    OrjsonProvider = None
+
 app = Flask(__name__)
+if OrjsonProvider is not None:
+    app.json = OrjsonProvider(app)
 app.secret_key = os.urandom(24)
 CORS(app, supports_credentials=True)  # Enable Cross-Origin requests with credentials
 
@@ -63,6 +89,10 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
 # Store user sessions
 user_sessions = {}
 
+# The server is threaded; serializes read-modify-write of the device JSON files
+# (reentrant: register_device holds it while storing the device's key)
+_devices_lock = threading.RLock()
+
 
 def get_local_ip():
     """Get the local IP address of this computer"""
@@ -94,29 +124,47 @@ def get_user_storage():
 
 # ==================== DEVICE SIGNATURE VERIFICATION ====================
 
+# In-memory copy of device_public_keys.json; this process is its only writer.
+# Copy-on-write: a published dict is never mutated, so readers can use it
+# without a lock while writers swap in a new one under _devices_lock.
+_device_public_keys = None
+
+
 def load_device_public_keys():
-    """Load device public keys from storage"""
-    devices_path = config.DATA_DIR / 'device_public_keys.json'
-    if devices_path.exists():
-        with open(devices_path, 'r') as f:
-            return json.load(f)
-    return {}
+    """Load device public keys from storage (read from disk once; treat as read-only)"""
+    global _device_public_keys
+    keys = _device_public_keys
+    if keys is None:
+        with _devices_lock:
+            if _device_public_keys is None:
+                devices_path = config.DATA_DIR / 'device_public_keys.json'
+                if devices_path.exists():
+                    with open(devices_path, 'r') as f:
+                        _device_public_keys = json.load(f)
+                else:
+                    _device_public_keys = {}
+            keys = _device_public_keys
+    return keys
 
 
 def save_device_public_keys(keys):
-    """Save device public keys to storage"""
+    """Save device public keys to storage (keys must not be mutated afterwards)"""
+    global _device_public_keys
     devices_path = config.DATA_DIR / 'device_public_keys.json'
-    devices_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(devices_path, 'w') as f:
-        json.dump(keys, f, indent=2)
+    with _devices_lock:
+        devices_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(devices_path, 'w') as f:
+            json.dump(keys, f, indent=2)
+        _device_public_keys = keys
 
 
 def store_device_public_key(user_id, device_id, public_key_b64):
     """Store the public key for a device"""
-    keys = load_device_public_keys()
-    key = f"{user_id}::{device_id}"
-    keys[key] = public_key_b64
-    save_device_public_keys(keys)
+    with _devices_lock:
+        keys = dict(load_device_public_keys())
+        key = f"{user_id}::{device_id}"
+        keys[key] = public_key_b64
+        save_device_public_keys(keys)
 
 
 def get_device_public_key(user_id, device_id):
@@ -155,6 +203,12 @@ def get_address_for_user(username):
     return address_book.get(username)
 
 
+@functools.lru_cache(maxsize=4096)
+def _verify_key_from_bytes(public_key_bytes):
+    """Parse an Ed25519 public key, once per distinct key"""
+    return VerifyKey(public_key_bytes)
+
+
 def verify_device_signature(user_id, device_id, message, signature_b64, public_key_b64=None):
     """Verify an Ed25519 signature from a device.
     
@@ -168,49 +222,81 @@ def verify_device_signature(user_id, device_id, message, signature_b64, public_k
     Returns:
         (is_valid, error_message)
     """
+    return verify_device_signatures_batch(
+        [(user_id, device_id, message, signature_b64, public_key_b64)]
+    )[0]
+
+
+def verify_device_signatures_batch(entries):
+    """Verify several Ed25519 device signatures in one call.
+    
+    The device key store is read at most once per batch; parsed public
+    keys are shared with every other call through _verify_key_from_bytes.
+    
+    Args:
+        entries: Iterable of (user_id, device_id, message, signature_b64, public_key_b64)
+                 tuples; public_key_b64 may be None to look it up from storage.
+                 The signature and public key may also be given as raw bytes.
+    
+    Returns:
+        List of (is_valid, error_message), one per entry, in order
+    """
+    entries = list(entries)
     if not HAS_NACL:
-        return False, "PyNaCl not installed for signature verification"
+        return [(False, "PyNaCl not installed for signature verification")] * len(entries)
     
-    try:
-        # Get public key from storage if not provided
-        if not public_key_b64:
-            public_key_b64 = get_device_public_key(user_id, device_id)
-        
-        if not public_key_b64:
-            return False, f"No public key registered for device {device_id}"
-        
-        # Decode public key from base64
-        try:
-            public_key_bytes = base64.b64decode(public_key_b64)
-        except Exception as e:
-            return False, f"Invalid public key encoding: {str(e)}"
-        
-        # Create VerifyKey from bytes
-        try:
-            verify_key = VerifyKey(public_key_bytes)
-        except Exception as e:
-            return False, f"Invalid public key format: {str(e)}"
-        
-        # Decode signature from base64
+    stored_keys = None
+    results = []
+    
+    for user_id, device_id, message, signature_b64, public_key_b64 in entries:
         try:
-            signature_bytes = base64.b64decode(signature_b64)
-        except Exception as e:
-            return False, f"Invalid signature encoding: {str(e)}"
+            # Get public key from storage if not provided
+            if not public_key_b64:
+                if stored_keys is None:
+                    stored_keys = load_device_public_keys()
+                public_key_b64 = stored_keys.get(f"{user_id}::{device_id}")
+            
+            if not public_key_b64:
+                results.append((False, f"No public key registered for device {device_id}"))
+                continue
+            
+            # Decode public key from base64 (unless already raw bytes)
+            try:
+                public_key_bytes = public_key_b64 if isinstance(public_key_b64, bytes) else base64.b64decode(public_key_b64)
+            except Exception as e:
+                results.append((False, f"Invalid public key encoding: {str(e)}"))
+                continue
+            
+            # Create VerifyKey from bytes (cached per device key)
+            try:
+                verify_key = _verify_key_from_bytes(public_key_bytes)
+            except Exception as e:
+                results.append((False, f"Invalid public key format: {str(e)}"))
+                continue
+            
+            # Decode signature from base64 (unless already raw bytes)
+            try:
+                signature_bytes = signature_b64 if isinstance(signature_b64, bytes) else base64.b64decode(signature_b64)
+            except Exception as e:
+                results.append((False, f"Invalid signature encoding: {str(e)}"))
+                continue
+            
+            # Verify signature
+            try:
+                # Message should be bytes
+                if isinstance(message, str):
+                    message = message.encode('utf-8')
+                verify_key.verify(message, signature_bytes)
+                results.append((True, None))
+            except BadSignatureError:
+                results.append((False, "Signature verification failed"))
+            except Exception as e:
+                results.append((False, f"Signature verification error: {str(e)}"))
         
-        # Verify signature
-        try:
-            # Message should be bytes
-            if isinstance(message, str):
-                message = message.encode('utf-8')
-            verify_key.verify(message, signature_bytes)
-            return True, None
-        except BadSignatureError:
-            return False, "Signature verification failed"
         except Exception as e:
-            return False, f"Signature verification error: {str(e)}"
+            results.append((False, f"Unexpected error during signature verification: {str(e)}"))
     
-    except Exception as e:
-        return False, f"Unexpected error during signature verification: {str(e)}"
+    return results
 
 
 # ==================== ROUTES ====================
@@ -504,9 +590,8 @@ def download(file_id):
         if encrypted_path.exists():
             # Read the encrypted bundle to get original name (file exists directly)
             print("🔍 DEBUG: Found encrypted file directly (cross-user download)")
-            with open(encrypted_path, 'r') as f:
-                bundle = json.load(f)
-                original_name = bundle.get('original_name', f'{file_id}.dat')
+            bundle = AESEncryption.load_encrypted_header(encrypted_path)
+            original_name = bundle.get('original_name', f'{file_id}.dat')
         else:
             # Fall back to checking blockchain for original name
             # Get block to find original filename
@@ -518,9 +603,8 @@ def download(file_id):
                 return jsonify({'error': 'File not found'}), 404
             
             # Get encrypted file path from block
-            with open(encrypted_path, 'r') as f:
-                bundle = json.load(f)
-                original_name = bundle.get('original_name', f'{file_id}.dat')
+            bundle = AESEncryption.load_encrypted_header(encrypted_path)
+            original_name = bundle.get('original_name', f'{file_id}.dat')
         
         print(f"🔍 DEBUG: Original filename: {original_name}")
         
@@ -533,6 +617,19 @@ def download(file_id):
         device_public_key = request.args.get('device_public_key')
         timestamp = request.args.get('timestamp')
         device_id = request.args.get('device_id')  # optional
+        public_key_raw = None
+        
+        # Internal callers can send the signature and key as hex headers
+        # instead of base64 query parameters
+        if request.headers.get('X-Sig-Encoding') == 'hex':
+            try:
+                device_signature = bytes.fromhex(request.headers.get('X-Device-Sig', ''))
+                public_key_raw = bytes.fromhex(request.headers.get('X-Device-Pub', '')) or None
+            except ValueError:
+                return jsonify({'error': 'Invalid hex in device signature headers'}), 400
+            if public_key_raw:
+                # Stored keys and derived device ids use the base64 form
+                device_public_key = base64.b64encode(public_key_raw).decode('ascii')
         
         if device_signature:
             # Client sent a signed request - verify it
@@ -556,7 +653,7 @@ def download(file_id):
                 device_id, 
                 message_to_verify, 
                 device_signature,
-                public_key_b64=device_public_key
+                public_key_b64=public_key_raw or device_public_key
             )
             
             if not is_valid:
@@ -615,8 +712,7 @@ def download(file_id):
                 # Try to read encrypted file directly (already verified it exists)
                 print(f"🔍 DEBUG: Cross-user download detected, using direct file read")
                 try:
-                    with open(encrypted_path, 'r') as f:
-                        bundle = json.load(f)
+                    bundle = AESEncryption.load_encrypted_header(encrypted_path)
                     
                     # For cross-user downloads, we can't decrypt without the key
                     # So return the encrypted file as-is for now
@@ -803,24 +899,25 @@ def register_device():
     device_public_key = data.get('device_public_key')  # base64-encoded Ed25519 public key
 
     devices_path = config.DATA_DIR / 'devices.json'
-    if devices_path.exists():
-        with open(devices_path, 'r') as f:
-            devices = json.load(f)
-    else:
-        devices = {}
+    with _devices_lock:
+        if devices_path.exists():
+            with open(devices_path, 'r') as f:
+                devices = json.load(f)
+        else:
+            devices = {}
 
-    user_devices = devices.get(user_id, [])
-    if device_id not in user_devices:
-        user_devices.append(device_id)
-    devices[user_id] = user_devices
+        user_devices = devices.get(user_id, [])
+        if device_id not in user_devices:
+            user_devices.append(device_id)
+        devices[user_id] = user_devices
 
-    with open(devices_path, 'w') as f:
-        json.dump(devices, f, indent=2)
+        with open(devices_path, 'w') as f:
+            json.dump(devices, f, indent=2)
 
-    # Store the device public key if provided
-    if device_public_key:
-        store_device_public_key(user_id, device_id, device_public_key)
-        print(f"✅ Stored public key for device {device_id} of user {user_id}")
+        # Store the device public key if provided
+        if device_public_key:
+            store_device_public_key(user_id, device_id, device_public_key)
+            print(f"✅ Stored public key for device {device_id} of user {user_id}")
 
     return jsonify({
         'device_id': device_id,
@@ -828,6 +925,22 @@ def register_device():
     })
 
 
+@app.route('/api/acl/device_keys', methods=['GET'])
+def acl_device_keys():
+    """Return the registered device public keys of one user.
+
+    Query: user (optional, defaults to the logged-in user)
+    Returns: { "<user>::<device_id>": device_public_key, ... }
+    """
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    prefix = (request.args.get('user') or user_id) + '::'
+    keys = load_device_public_keys()
+    return jsonify({k: v for k, v in keys.items() if k.startswith(prefix)})
+
+
 
 @app.route('/api/acl/grant', methods=['POST'])
 def acl_grant():
@@ -8,9 +8,107 @@ GCM (Galois/Counter Mode) provides both confidentiality and authenticity.
 
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
+import binascii
 import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
 import config
 
+# OpenSSL's AES-GCM (through the optional cryptography package) is used when
+# available; pycryptodome is the fallback. Both produce identical output.
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.exceptions import InvalidTag
+    HAS_OPENSSL_GCM = True
+except ImportError:
+    HAS_OPENSSL_GCM = False
+
+# On-disk container for encrypted files:
+#   magic | nonce_len, tag_len, ciphertext_len (<III) | nonce | tag | ciphertext | original_name
+ENCRYPTED_FILE_MAGIC = b'SCF1'
+ENCRYPTED_FILE_HEADER = struct.Struct('<III')
+
+# Bytes encrypted/decrypted per step when streaming a container
+STREAM_CHUNK_SIZE = 1 << 20
+# Decrypted chunks handed to the kernel per write call when streaming
+STREAM_WRITE_BATCH = 4
+GCM_TAG_SIZE = 16
+GCM_NONCE_SIZE = 16  # pycryptodome's default, kept so existing files still decrypt
+
+
+def _gcm_encryptor(key):
+    """
+    Start an incremental AES-GCM encryption with a fresh random nonce
+    
+    Returns:
+        tuple: (nonce, update(chunk) -> ciphertext, finish() -> tag)
+    """
+    nonce = get_random_bytes(GCM_NONCE_SIZE)
+    if HAS_OPENSSL_GCM:
+        encryptor = Cipher(algorithms.AES(key), modes.GCM(nonce)).encryptor()
+        
+        def finish():
+            encryptor.finalize()
+            return encryptor.tag
+        
+        return nonce, encryptor.update, finish
+    
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+    return nonce, cipher.encrypt, cipher.digest
+
+
+def _gcm_decryptor(key, nonce, tag):
+    """
+    Start an incremental AES-GCM decryption
+    
+    Returns:
+        tuple: (update(chunk) -> plaintext,
+                update_into(chunk, buf) -> bytes written into buf,
+                verify() raising ValueError on a bad tag)
+    """
+    if HAS_OPENSSL_GCM:
+        decryptor = Cipher(algorithms.AES(key), modes.GCM(nonce, tag)).decryptor()
+        
+        def verify():
+            try:
+                decryptor.finalize()
+            except InvalidTag as e:
+                raise ValueError("MAC check failed") from e
+        
+        return decryptor.update, decryptor.update_into, verify
+    
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+    
+    def update_into(chunk, buf):
+        n = len(chunk)
+        cipher.decrypt(chunk, output=buf[:n])
+        return n
+    
+    return cipher.decrypt, update_into, lambda: cipher.verify(tag)
+
+
+def _write_all(fd, views):
+    """Write a batch of buffers to fd, one writev call where the OS allows it"""
+    if not hasattr(os, 'writev'):
+        for view in views:
+            while view:
+                view = view[os.write(fd, view):]
+        views.clear()
+        return
+    
+    while views:
+        written = os.writev(fd, views)
+        while views and written >= len(views[0]):
+            written -= len(views[0])
+            views.pop(0)
+        if views and written:
+            views[0] = views[0][written:]
+
+
 class AESEncryption:
     """
     AES-256-GCM encryption handler
@@ -43,15 +141,16 @@ class AESEncryption:
         if len(key) != self.key_size:
             raise ValueError(f"Key must be {self.key_size} bytes, got {len(key)}")
         
-        # Create cipher object with random nonce
-        cipher = AES.new(key, AES.MODE_GCM)
+        # Create cipher with random nonce
+        nonce, update, finish = _gcm_encryptor(key)
         
         # Encrypt and get authentication tag
-        ciphertext, tag = cipher.encrypt_and_digest(plaintext_data)
+        ciphertext = update(plaintext_data)
+        tag = finish()
         
         return {
             'ciphertext': ciphertext,
-            'nonce': cipher.nonce,
+            'nonce': nonce,
             'tag': tag
         }
     
@@ -74,18 +173,196 @@ class AESEncryption:
             raise ValueError(f"Key must be {self.key_size} bytes, got {len(key)}")
         
         # Create cipher with the same nonce used for encryption
-        cipher = AES.new(key, AES.MODE_GCM, nonce=encrypted_data['nonce'])
+        update, _, verify = _gcm_decryptor(key, encrypted_data['nonce'], encrypted_data['tag'])
         
         # Decrypt and verify authentication tag
         try:
-            plaintext = cipher.decrypt_and_verify(
-                encrypted_data['ciphertext'],
-                encrypted_data['tag']
-            )
+            plaintext = update(encrypted_data['ciphertext'])
+            verify()
             return plaintext
         except ValueError as e:
             raise ValueError("Decryption failed: Data may have been tampered with") from e
     
+    @staticmethod
+    def key_context(key):
+        """
+        Build a reusable AES-GCM context for key
+        
+        Holding on to the context skips the key schedule setup when the
+        same key encrypts or decrypts another single-chunk file.
+        
+        Args:
+            key: bytes - 32-byte AES key
+            
+        Returns:
+            AESGCM object, or None when OpenSSL GCM is not available
+        """
+        return AESGCM(bytes(key)) if HAS_OPENSSL_GCM else None
+    
+    def encrypt_file_to(self, plaintext_data, key, path, original_name, context=None):
+        """
+        Encrypt file data straight into a container file, chunk by chunk
+        
+        Container layout: magic, header, nonce, tag, ciphertext, original
+        name. Only one STREAM_CHUNK_SIZE block of ciphertext is held in
+        memory at a time.
+        The tag is only known at the end, so its slot is filled in last.
+        
+        Args:
+            plaintext_data: bytes-like - File data (bytes, memoryview or mmap)
+            key: bytes - 32-byte AES key
+            path: Path - Destination file
+            original_name: str - Name of the plaintext file
+            context: AESGCM - key_context(key), used for single-chunk files (optional)
+            
+        Returns:
+            dict containing nonce and tag
+        """
+        if len(key) != self.key_size:
+            raise ValueError(f"Key must be {self.key_size} bytes, got {len(key)}")
+        
+        data = memoryview(plaintext_data)
+        if context is not None and len(data) <= STREAM_CHUNK_SIZE:
+            nonce = get_random_bytes(GCM_NONCE_SIZE)
+            sealed = context.encrypt(nonce, data, None)
+            tag = sealed[-GCM_TAG_SIZE:]
+            with open(path, 'wb') as f:
+                f.write(ENCRYPTED_FILE_MAGIC)
+                f.write(ENCRYPTED_FILE_HEADER.pack(len(nonce), GCM_TAG_SIZE, len(data)))
+                f.write(nonce)
+                f.write(tag)
+                f.write(memoryview(sealed)[:-GCM_TAG_SIZE])
+                f.write(original_name.encode('utf-8'))
+            return {'nonce': nonce, 'tag': tag}
+        
+        nonce, update, finish = _gcm_encryptor(key)
+        
+        with open(path, 'wb') as f:
+            f.write(ENCRYPTED_FILE_MAGIC)
+            f.write(ENCRYPTED_FILE_HEADER.pack(len(nonce), GCM_TAG_SIZE, len(data)))
+            f.write(nonce)
+            tag_offset = f.tell()
+            f.write(bytes(GCM_TAG_SIZE))
+            
+            for start in range(0, len(data), STREAM_CHUNK_SIZE):
+                f.write(update(data[start:start + STREAM_CHUNK_SIZE]))
+            f.write(original_name.encode('utf-8'))
+            
+            tag = finish()
+            f.seek(tag_offset)
+            f.write(tag)
+        
+        return {'nonce': nonce, 'tag': tag}
+    
+    def decrypt_file_to(self, path, key, output_path, header=None, context=None):
+        """
+        Decrypt a container file into output_path, chunk by chunk
+        
+        Plaintext goes to a temporary file next to output_path which is only
+        renamed into place once the tag has verified, so a tampered file
+        never leaves partial output behind. Legacy JSON bundles are
+        decrypted in memory.
+        
+        Args:
+            path: Path - Encrypted file
+            key: bytes - 32-byte AES key
+            output_path: Path - Where to write the plaintext
+            header: dict - Result of load_encrypted_header(path), if already read
+            context: AESGCM - key_context(key), used for single-chunk files (optional)
+            
+        Returns:
+            int: Number of plaintext bytes written
+            
+        Raises:
+            ValueError: if authentication fails (tampered data)
+        """
+        if len(key) != self.key_size:
+            raise ValueError(f"Key must be {self.key_size} bytes, got {len(key)}")
+        if header is None:
+            header = self.load_encrypted_header(path)
+        
+        # Unique temp file beside the output, so concurrent downloads to the
+        # same path never share one
+        output_dir, output_name = os.path.split(os.path.abspath(output_path))
+        fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=f".{output_name}.", suffix='.part')
+        try:
+            with open(fd, 'wb') as out:
+                if 'ciphertext' in header:
+                    plaintext = self.decrypt_file(header, key)
+                    out.write(plaintext)
+                    size = len(plaintext)
+                elif context is not None and header['ciphertext_len'] <= STREAM_CHUNK_SIZE:
+                    size = self._decrypt_whole(path, header, context, out)
+                else:
+                    size = self._decrypt_stream(path, header, key, out)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        
+        return size
+    
+    def _decrypt_whole(self, path, header, context, out):
+        """Decrypt a single-chunk container's ciphertext into out in one call"""
+        with open(path, 'rb') as f:
+            f.seek(header['ciphertext_offset'])
+            ciphertext = f.read(header['ciphertext_len'])
+        if len(ciphertext) < header['ciphertext_len']:
+            raise ValueError("Decryption failed: Encrypted file is truncated")
+        
+        try:
+            plaintext = context.decrypt(header['nonce'], ciphertext + header['tag'], None)
+        except InvalidTag as e:
+            raise ValueError("Decryption failed: Data may have been tampered with") from e
+        out.write(plaintext)
+        return len(plaintext)
+    
+    def _decrypt_stream(self, path, header, key, out):
+        """
+        Decrypt a binary container's ciphertext into the open file out
+        
+        The container is memory-mapped and ciphertext slices go straight to
+        the cipher, which decrypts into a small pool of reusable buffers
+        that are flushed with a single writev per STREAM_WRITE_BATCH chunks.
+        """
+        _, update_into, verify = _gcm_decryptor(key, header['nonce'], header['tag'])
+        start = header['ciphertext_offset']
+        end = start + header['ciphertext_len']
+        
+        # OpenSSL's update_into wants one block of slack past the input size
+        out_bufs = [memoryview(bytearray(STREAM_CHUNK_SIZE + 15)) for _ in range(STREAM_WRITE_BATCH)]
+        pending = []
+        
+        out.flush()
+        out_fd = out.fileno()
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < end:
+                raise ValueError("Decryption failed: Encrypted file is truncated")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, 'madvise'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                ciphertext = memoryview(mm)
+                try:
+                    for pos in range(start, end, STREAM_CHUNK_SIZE):
+                        chunk = ciphertext[pos:min(pos + STREAM_CHUNK_SIZE, end)]
+                        buf = out_bufs[len(pending)]
+                        pending.append(buf[:update_into(chunk, buf)])
+                        if len(pending) == STREAM_WRITE_BATCH:
+                            _write_all(out_fd, pending)
+                    _write_all(out_fd, pending)
+                finally:
+                    chunk = None
+                    ciphertext.release()
+        
+        try:
+            verify()
+        except ValueError as e:
+            raise ValueError("Decryption failed: Data may have been tampered with") from e
+        return header['ciphertext_len']
+    
     @staticmethod
     def generate_random_key():
         """
@@ -108,6 +385,90 @@ class AESEncryption:
             bytes: 32-byte key derived from hash
         """
         return hashlib.sha256(data).digest()
+    
+    @staticmethod
+    def load_encrypted_header(path):
+        """
+        Read the metadata of an encrypted file without loading its ciphertext
+        
+        Legacy JSON bundles have no separate header, so for those this is
+        the same as load_encrypted_file.
+        
+        Args:
+            path: Path - Encrypted file
+            
+        Returns:
+            dict containing nonce, tag, original_name, ciphertext_offset and
+            ciphertext_len (or the full load_encrypted_file dict for legacy files)
+        """
+        with open(path, 'rb') as f:
+            magic = f.read(len(ENCRYPTED_FILE_MAGIC))
+            if magic != ENCRYPTED_FILE_MAGIC:
+                return AESEncryption.load_encrypted_file(path)
+            
+            nonce_len, tag_len, ciphertext_len = ENCRYPTED_FILE_HEADER.unpack(
+                f.read(ENCRYPTED_FILE_HEADER.size)
+            )
+            nonce = f.read(nonce_len)
+            tag = f.read(tag_len)
+            ciphertext_offset = f.tell()
+            f.seek(ciphertext_len, os.SEEK_CUR)
+            original_name = f.read().decode('utf-8')
+        
+        return {
+            'nonce': nonce,
+            'tag': tag,
+            'original_name': original_name,
+            'ciphertext_offset': ciphertext_offset,
+            'ciphertext_len': ciphertext_len
+        }
+    
+    @staticmethod
+    def load_encrypted_file(path):
+        """
+        Read an encrypted file written by encrypt_file_to
+        
+        Older hex-encoded JSON bundles are still accepted.
+        
+        Args:
+            path: Path - Encrypted file
+            
+        Returns:
+            dict containing ciphertext, nonce, tag and original_name
+        """
+        with open(path, 'rb') as f:
+            raw = f.read()
+        
+        if not raw.startswith(ENCRYPTED_FILE_MAGIC):
+            bundle = json.loads(raw)
+            encrypted_data = {
+                'ciphertext': binascii.a2b_hex(bundle['ciphertext']),
+                'nonce': binascii.a2b_hex(bundle['nonce']),
+                'tag': binascii.a2b_hex(bundle['tag'])
+            }
+            if 'original_name' in bundle:
+                encrypted_data['original_name'] = bundle['original_name']
+            return encrypted_data
+        
+        offset = len(ENCRYPTED_FILE_MAGIC)
+        nonce_len, tag_len, ciphertext_len = ENCRYPTED_FILE_HEADER.unpack_from(raw, offset)
+        offset += ENCRYPTED_FILE_HEADER.size
+        
+        # Slice through a memoryview so the ciphertext is not copied again
+        view = memoryview(raw)
+        nonce = bytes(view[offset:offset + nonce_len])
+        offset += nonce_len
+        tag = bytes(view[offset:offset + tag_len])
+        offset += tag_len
+        ciphertext = view[offset:offset + ciphertext_len]
+        offset += ciphertext_len
+        
+        return {
+            'ciphertext': ciphertext,
+            'nonce': nonce,
+            'tag': tag,
+            'original_name': bytes(view[offset:]).decode('utf-8')
+        }
 
 
 # ============================================================================
@@ -9,9 +9,18 @@ ECC is used to encrypt blockchain blocks so only the user with private key can d
 from ecdsa import SigningKey, VerifyingKey, SECP256k1
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
+import base64
+import binascii
 import hashlib
 import config
 
+# Fields produced by ECCEncryption.encrypt_data
+ENCRYPTED_FIELDS = (
+    'ciphertext', 'nonce', 'tag',
+    'encrypted_key', 'key_nonce', 'key_tag',
+    'ephemeral_public_key'
+)
+
 class ECCEncryption:
     """
     ECC-based encryption handler using secp256k1 curve
@@ -85,22 +94,38 @@ class ECCEncryption:
         except FileNotFoundError:
             return None, None
     
-    def encrypt_data(self, data, public_key):
+    @staticmethod
+    def load_public_key(user_id):
         """
-        Encrypt data using hybrid encryption (ECIES-like)
+        Load only a user's public key (e.g. to encrypt something for them)
         
-        Process:
-        1. Generate random AES key
-        2. Encrypt data with AES
-        3. Derive shared secret from public key
-        4. Encrypt AES key with shared secret
+        Args:
+            user_id: Unique identifier for the user
+            
+        Returns:
+            VerifyingKey object or None if not found
+        """
+        try:
+            with open(config.get_key_path(user_id, 'public'), 'rb') as f:
+                return VerifyingKey.from_pem(f.read())
+        except FileNotFoundError:
+            return None
+    
+    def derive_shared_secret(self, public_key):
+        """
+        Run the ECDH half of encrypt_data for a recipient
+        
+        The result can be passed back to encrypt_data to wrap several
+        messages for the same recipient with one ECDH. Every wrap still
+        gets its own AES key and nonce, but the messages share one
+        ephemeral public key (so they are linkable) and one secret, so
+        callers should only keep it for a short time.
         
         Args:
-            data: bytes - Data to encrypt
             public_key: VerifyingKey object
             
         Returns:
-            dict containing encrypted data and metadata
+            tuple: (ephemeral_public_key bytes, shared_secret bytes)
         """
         # Generate ephemeral key pair
         ephemeral_private = SigningKey.generate(curve=self.curve)
@@ -112,6 +137,31 @@ class ECCEncryption:
             str(shared_point.x()).encode() + str(shared_point.y()).encode()
         ).digest()
         
+        return ephemeral_public.to_string(), shared_secret
+    
+    def encrypt_data(self, data, public_key, shared_secret=None):
+        """
+        Encrypt data using hybrid encryption (ECIES-like)
+        
+        Process:
+        1. Generate random AES key
+        2. Encrypt data with AES
+        3. Derive shared secret from public key
+        4. Encrypt AES key with shared secret
+        
+        Args:
+            data: bytes - Data to encrypt
+            public_key: VerifyingKey object
+            shared_secret: tuple - Optional result of derive_shared_secret
+                for public_key, to skip a fresh ECDH
+            
+        Returns:
+            dict containing encrypted data and metadata
+        """
+        if shared_secret is None:
+            shared_secret = self.derive_shared_secret(public_key)
+        ephemeral_public, shared_secret = shared_secret
+        
         # Generate random AES key
         aes_key = get_random_bytes(32)
         
@@ -130,7 +180,7 @@ class ECCEncryption:
             'encrypted_key': encrypted_key,
             'key_nonce': key_cipher.nonce,
             'key_tag': key_tag,
-            'ephemeral_public_key': ephemeral_public.to_string()
+            'ephemeral_public_key': ephemeral_public
         }
     
     def decrypt_data(self, encrypted_data, private_key):
@@ -172,6 +222,42 @@ class ECCEncryption:
         
         return plaintext
     
+    @staticmethod
+    def pack_encrypted_data(encrypted_data):
+        """
+        Convert encrypt_data output to a JSON-serializable dict
+        
+        Fields are base64 encoded (C-accelerated, 4/3 size instead of hex's 2x).
+        
+        Args:
+            encrypted_data: dict from encrypt_data
+            
+        Returns:
+            dict: Base64 string fields plus an 'encoding' marker
+        """
+        packed = {
+            field: base64.b64encode(encrypted_data[field]).decode('ascii')
+            for field in ENCRYPTED_FIELDS
+        }
+        packed['encoding'] = 'base64'
+        return packed
+    
+    @staticmethod
+    def unpack_encrypted_data(packed):
+        """
+        Convert a dict from pack_encrypted_data back to bytes fields
+        
+        Dicts without an 'encoding' marker are treated as the older hex format.
+        
+        Args:
+            packed: dict - Serialized encrypted data (extra keys are ignored)
+            
+        Returns:
+            dict: Input for decrypt_data
+        """
+        decode = base64.b64decode if packed.get('encoding') == 'base64' else binascii.a2b_hex
+        return {field: decode(packed[field]) for field in ENCRYPTED_FIELDS}
+    
     @staticmethod
     def public_key_to_string(public_key):
         """Convert public key to hex string"""
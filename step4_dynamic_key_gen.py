@@ -16,6 +16,12 @@ This ensures each file gets a unique key that changes even for the same file con
 import hashlib
 import config
 
+try:
+    import blake3
+    HAS_BLAKE3 = True
+except ImportError:
+    HAS_BLAKE3 = False
+
 class DynamicKeyGenerator:
     """
     Dynamic AES key generator based on file hash and blockchain hash
@@ -28,6 +34,9 @@ class DynamicKeyGenerator:
     
     def __init__(self):
         self.hash_algorithm = config.HASH_ALGORITHM
+        if self.hash_algorithm == 'blake3' and not HAS_BLAKE3:
+            print("⚠️  blake3 not installed, falling back to SHA-256 for file hashes")
+            self.hash_algorithm = 'sha256'
     
     def hash_data(self, data):
         """
@@ -47,12 +56,19 @@ class DynamicKeyGenerator:
         """
         Generate hash of file content
         
+        Keys are derived from this hash, so a file uploaded under one
+        HASH_ALGORITHM gets a different key under the other; keep the
+        setting fixed for an existing blockchain.
+        
         Args:
             file_data: bytes - File content
             
         Returns:
-            bytes: SHA-256 hash of file
+            bytes: 32-byte hash of file (SHA-256, or BLAKE3 if configured)
         """
+        if self.hash_algorithm == 'blake3':
+            # BLAKE3 hashes large files across SIMD lanes and threads
+            return blake3.blake3(file_data, max_threads=blake3.blake3.AUTO).digest()
         return self.hash_data(file_data)
     
     def generate_block_hash(self, block_data):
@@ -92,7 +108,7 @@ class DynamicKeyGenerator:
         Generate dynamic AES key using the paper's algorithm
         
         Algorithm:
-        1. file_hash = SHA-256(file_data)
+        1. file_hash = SHA-256(file_data) (BLAKE3 if config.HASH_ALGORITHM = 'blake3')
         2. block_hash = SHA-256(last_block)
         3. key = file_hash XOR block_hash
         
@@ -106,6 +122,23 @@ class DynamicKeyGenerator:
         # Step 1: Hash the file
         file_hash = self.generate_file_hash(file_data)
         
+        # Steps 2-3: Hash the last block and XOR
+        return self.generate_dynamic_key_from_hash(file_hash, last_block_content)
+    
+    def generate_dynamic_key_from_hash(self, file_hash, last_block_content):
+        """
+        Generate dynamic AES key from an already computed file hash
+        
+        Same as generate_dynamic_key, for callers that hashed the file
+        while reading it and should not pass over the data a second time.
+        
+        Args:
+            file_hash: bytes - 32-byte file hash from generate_file_hash (SHA-256 or BLAKE3)
+            last_block_content: str/dict - Content of last block in blockchain
+            
+        Returns:
+            bytes: 32-byte AES-256 key
+        """
         # Step 2: Hash the last block
         block_hash = self.generate_block_hash(last_block_content)
         
@@ -15,10 +15,73 @@ Block Structure (from paper):
 """
 
 import hashlib
+import functools
 import json
+from json.encoder import encode_basestring_ascii
+import os
+import struct
 from datetime import datetime
+from pathlib import Path
 import config
 
+# Append-only journal kept next to the JSON snapshot, one record per block:
+#   record length (<I) | block.to_dict() as UTF-8 JSON
+CHAIN_LOG_RECORD = struct.Struct('<I')
+
+# hashlib's SHA-256 comes from OpenSSL, which picks the SHA-NI code path at
+# runtime on CPUs that have it, so block hashing only needs to avoid
+# per-call setup. Same output as json.dumps(..., sort_keys=True).
+_BLOCK_ENCODER = json.JSONEncoder(sort_keys=True)
+_sha256 = hashlib.sha256
+
+
+@functools.lru_cache(maxsize=64)
+def _block_key_prefixes(keys):
+    """JSON text before each value ('{"ciphertext": ', ', "nonce": ', ...) for a key order"""
+    return tuple((', ' if i else '{') + encode_basestring_ascii(key) + ': '
+                 for i, key in enumerate(keys))
+
+
+def _dumps_block_data(block_data):
+    """
+    Serialize a block data dict to JSON, same output as json.dumps
+    
+    Block data is ECCEncryption.pack_encrypted_data output plus a few plain
+    fields, so it comes in a handful of fixed shapes and its values are
+    almost always str or bool. The key part of the text is cached per key
+    order (a small bounded LRU) and only values are encoded per call.
+    
+    Args:
+        block_data: dict - Block data to serialize
+        
+    Returns:
+        str: JSON text
+    """
+    parts = []
+    for prefix, value in zip(_block_key_prefixes(tuple(block_data)), block_data.values()):
+        if value.__class__ is str:
+            parts.append(prefix + encode_basestring_ascii(value))
+        elif value is True or value is False:
+            parts.append(prefix + ('true' if value else 'false'))
+        else:
+            parts.append(prefix + json.dumps(value))
+    return ''.join(parts) + '}' if parts else '{}'
+
+
+# Block data (de)serializers shared by the storage classes. orjson (C
+# extension) is optional; block data is plain JSON either way.
+try:
+    import orjson
+
+    def dumps_block_data(block_data):
+        """Serialize a block data dict to JSON text"""
+        return orjson.dumps(block_data).decode('utf-8')
+
+    loads_block_data = orjson.loads
+except ImportError:
+    dumps_block_data = _dumps_block_data
+    loads_block_data = json.loads
+
 class Block:
     """
     Represents a single block in the blockchain
@@ -56,16 +119,16 @@ class Block:
         Returns:
             str: Hexadecimal hash string
         """
-        block_string = json.dumps({
+        block_string = _BLOCK_ENCODER.encode({
             'block_id': self.block_id,
             'timestamp': self.timestamp,
             'data': self.data,
             'previous_hash': self.previous_hash,
             'file_id': self.file_id,
             'owner': self.owner
-        }, sort_keys=True)
+        })
         
-        return hashlib.sha256(block_string.encode()).hexdigest()
+        return _sha256(block_string.encode()).hexdigest()
     
     def to_dict(self):
         """
@@ -141,6 +204,13 @@ class Blockchain:
         self.owner = owner
         self.chain = []
         self.branches = {}  # For file sharing: branch_id -> [blocks]
+        self._by_file_id = {}  # file_id -> first block in chain with that file_id
+        self._journal_blocks = 0  # Records in the journal since the last snapshot
+    
+    def _append(self, block):
+        """Append a block to the main chain and index it by file_id"""
+        self.chain.append(block)
+        self._by_file_id.setdefault(block.file_id, block)
     
     def create_genesis_block(self):
         """
@@ -156,7 +226,7 @@ class Blockchain:
             file_id="genesis",
             owner=self.owner
         )
-        self.chain.append(genesis_block)
+        self._append(genesis_block)
         return genesis_block
     
     def get_latest_block(self):
@@ -193,9 +263,21 @@ class Blockchain:
             owner=self.owner
         )
         
-        self.chain.append(new_block)
+        self._append(new_block)
         return new_block
     
+    def discard_latest_block(self):
+        """
+        Remove the latest block from the main chain (undoes add_block)
+        
+        Returns:
+            Block: The removed block
+        """
+        block = self.chain.pop()
+        if self._by_file_id.get(block.file_id) is block:
+            del self._by_file_id[block.file_id]
+        return block
+    
     def get_block_by_id(self, block_id):
         """
         Retrieve block by its ID
@@ -221,10 +303,7 @@ class Blockchain:
         Returns:
             Block: Found block or None
         """
-        for block in self.chain:
-            if block.file_id == file_id:
-                return block
-        return None
+        return self._by_file_id.get(file_id)
     
     def validate_chain(self):
         """
@@ -312,10 +391,9 @@ class Blockchain:
         blockchain = Blockchain(blockchain_dict['owner'])
         
         # Restore main chain with error handling
-        blockchain.chain = []
         for b in blockchain_dict['chain']:
             try:
-                blockchain.chain.append(Block.from_dict(b))
+                blockchain._append(Block.from_dict(b))
             except Exception as e:
                 print(f"⚠️  Failed to load block {b.get('block_id', 'unknown')}: {e}")
                 continue
@@ -332,10 +410,50 @@ class Blockchain:
         
         return blockchain
     
+    @staticmethod
+    def journal_path(filepath):
+        """
+        Path of the append-only journal that goes with a snapshot file
+        
+        Args:
+            filepath: Path - Snapshot (JSON) file path
+            
+        Returns:
+            Path: Journal file path
+        """
+        return Path(filepath).with_suffix('.log')
+    
+    @staticmethod
+    def file_stamp(filepath):
+        """
+        Cheap change marker for a saved blockchain
+        
+        Args:
+            filepath: Path - Snapshot (JSON) file path
+            
+        Returns:
+            tuple: (mtime_ns, size) of the snapshot and of its journal (None
+            if there is no journal), or None if there is no snapshot
+        """
+        stamp = []
+        for path in (Path(filepath), Blockchain.journal_path(filepath)):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                if not stamp:
+                    return None
+                stamp.append(None)
+                continue
+            stamp.append((st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+    
     def save_to_file(self, filepath=None):
         """
         Save blockchain to JSON file
         
+        Writes a full snapshot and empties the journal, since every block
+        in it is now part of the snapshot.
+        
         Args:
             filepath: Path - Optional custom path
         """
@@ -344,12 +462,95 @@ class Blockchain:
         
         with open(filepath, 'w') as f:
             json.dump(self.to_dict(), f, indent=2)
+        
+        try:
+            self.journal_path(filepath).unlink()
+        except FileNotFoundError:
+            pass
+        self._journal_blocks = 0
+    
+    def append_block_to_disk(self, block, filepath=None):
+        """
+        Persist one new block by appending it to the journal
+        
+        Cost is independent of chain length, unlike save_to_file. Falls
+        back to a full snapshot when none exists yet, and compacts the
+        journal into a new snapshot every config.CHAIN_LOG_COMPACT_BLOCKS
+        blocks so loading stays cheap.
+        
+        Args:
+            block: Block - Block just added to the main chain
+            filepath: Path - Optional custom snapshot path
+        """
+        if filepath is None:
+            filepath = config.get_blockchain_path(self.owner)
+        
+        if not Path(filepath).exists() or self._journal_blocks >= config.CHAIN_LOG_COMPACT_BLOCKS:
+            self.save_to_file(filepath)
+            return
+        
+        record = json.dumps(block.to_dict()).encode('utf-8')
+        with open(self.journal_path(filepath), 'ab') as f:
+            f.write(CHAIN_LOG_RECORD.pack(len(record)) + record)
+        self._journal_blocks += 1
+    
+    def _replay_journal(self, filepath):
+        """
+        Append the blocks recorded in the journal after the snapshot
+        
+        Records are applied in block_id order. Records for blocks the
+        chain already has (left behind if a save was interrupted) are
+        skipped, as is a partially written final record. A record that
+        doesn't follow on from the chain (written by a storage object
+        whose copy of the chain was out of date) is kept, since it holds
+        a file's key, and re-linked after the latest block with a warning.
+        
+        Args:
+            filepath: Path - Snapshot file path
+        """
+        try:
+            with open(self.journal_path(filepath), 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return
+        
+        offset = 0
+        pending = []
+        while offset + CHAIN_LOG_RECORD.size <= len(raw):
+            (length,) = CHAIN_LOG_RECORD.unpack_from(raw, offset)
+            offset += CHAIN_LOG_RECORD.size
+            if offset + length > len(raw):
+                break
+            
+            pending.append(json.loads(raw[offset:offset + length]))
+            offset += length
+        
+        pending.sort(key=lambda b: b['block_id'])  # Stable: ties keep journal order
+        for b in pending:
+            block_id = b['block_id']
+            if block_id < len(self.chain) and self.chain[block_id].hash == b.get('hash'):
+                continue
+            
+            block = Block.from_dict(b)
+            latest_block = self.get_latest_block()
+            previous_hash = latest_block.hash if latest_block else "0"
+            if block_id != len(self.chain) or block.previous_hash != previous_hash:
+                print(f"⚠️  Journaled block #{block_id} does not follow the chain; "
+                      f"re-linked as block #{len(self.chain)}")
+                block.block_id = len(self.chain)
+                block.previous_hash = previous_hash
+                block.hash = block.calculate_hash()
+            self._append(block)
+        
+        self._journal_blocks = len(pending)
     
     @staticmethod
     def load_from_file(filepath):
         """
         Load blockchain from JSON file
         
+        Blocks appended to the journal since the snapshot are replayed.
+        
         Args:
             filepath: Path - File path
             
@@ -358,7 +559,9 @@ class Blockchain:
         """
         with open(filepath, 'r') as f:
             data = json.load(f)
-        return Blockchain.from_dict(data)
+        blockchain = Blockchain.from_dict(data)
+        blockchain._replay_journal(filepath)
+        return blockchain
     
     def __len__(self):
         """Return number of blocks in main chain"""
@@ -7,11 +7,14 @@ Blocks are stored on the Ethereum blockchain via smart contract.
 """
 
 from web3 import Web3
+from contextlib import contextmanager
+import queue
+import requests
 import json
 import config
 
 # Smart Contract ABI for storing blockchain blocks
-BLOCKCHAIN_STORAGE_ABI = json.dumps([
+BLOCKCHAIN_STORAGE_ABI = [
     {
         "inputs": [],
         "stateMutability": "nonpayable",
@@ -46,12 +49,21 @@ BLOCKCHAIN_STORAGE_ABI = json.dumps([
         "stateMutability": "view",
         "type": "function"
     }
-])
+]
 
 # Smart Contract Bytecode
 BLOCKCHAIN_STORAGE_BYTECODE = "0x608060405234801561001057600080fd5b50610596806100206000396000f3fe608060405234801561001057600080fd5b50600436106100415760003560e01c8063359b6e3114610046578063a3c4bcf814610062578063de78f6b814610092575b600080fd5b610060600480360381019061005b91906102d0565b6100c2565b005b61007c60048036038101906100779190610338565b61013a565b6040516100899190610412565b60405180910390f35b6100ac60048036038101906100a79190610434565b610203565b6040516100b99190610470565b60405180910390f35b60006040518060400160405280848152602001838152509050600080866040516100ec91906104c7565b908152602001604051809103902090508060010180548060010182816101129190610523565b9160005260206000209001600090919091509080519060200190610137929190610209565b50505050505050565b606060008060008681526020019081526020016000208054905090508381106101935761019b565b600060010190505b8061019f5761019a60015484010190505b6101a35761019557600080868152602001908152602001600020818154811061019c575b600001805461019f9061054a565b80601f01602080910402602001604051908101604052809291908181526020018280546101d0906104de565b801561021d5780601f106101f25761010080835404028352916020019161021d565b820191906000526020600020905b81548152906001019060200180831161020057829003601f168201915b505050505091505092915050565b60008060008360405161021691906104c7565b908152602001604051809103902060010180549050905080915050919050565b82805461024290610509565b90600052602060002090601f01602090048101928261026457600085556102ab565b82601f1061027d57805160ff19168380011785556102ab565b828001600101855582156102ab579182015b828111156102aa57825182559160200191906001019061028f565b5b5090506102b891906102bc565b5090565b5b808211156102d55760008160009055506001016102bd565b5090565b6000806000604084860312156102ee57600080fd5b600084013567ffffffffffffffff81111561030857600080fd5b61031486828701610555565b935050602084013567ffffffffffffffff81111561033157600080fd5b61033d86828701610555565b9250509250925092565b60008060006060848603121561035c57600080fd5b600084013567ffffffffffffffff81111561037657600080fd5b61038286828701610555565b935050602084013590509250925092565b60006103a8601583856105a9565b91506103b3826105c7565b602082019050919050565b6000602082840312156103d057600080fd5b600082015167ffffffffffffffff8111156103ea57600080fd5b6103f684828501610555565b91505092915050565b61040881610598565b82525050565b600060208201905081810360008301526104288184610555565b905092915050565b60006020828403121561044257600080fd5b600082013567ffffffffffffffff81111561045c57600080fd5b61046884828501610555565b91505092915050565b600060208201905061048660008301846103ff565b92915050565b600061049782610588565b6104a181856105a9565b93506104b18185602086016105ba565b6104ba816105f0565b840191505092915050565b60006104d082610588565b6104da81856105ba565b93506104ea8185602086016105ba565b80840191505092915050565b600060208201905081810360008301526104f8818461048c565b905092915050565b6000600282049050600182168061051757607f821691505b60208210810361052a5761052961053b565b5b50919050565b634e487b7160e01b600052602260045260246000fd5b60006020828403121561056057600080fd5b600082013567ffffffffffffffff81111561057a57600080fd5b61058684828501610555565b91505092915050565b600081519050919050565b6000819050919050565b600082825260208201905092915050565b600082825260208201905092915050565b60005b838110156105d85780820151818401526020810190506105bd565b838111156105e7576000848401525b50505050565b6000601f19601f8301169050919050565b7f426c6f636b206e6f7420666f756e640000000000000000000000000000000000600082015250565b6105278161058856fea264697066735822122086c8a0b1f5c8c5b8f5e0f5c8c5b8f5e0f5c8c5b8f5e0f5c8c5b8f5e0f564736f6c634300080a0033"
 
 
+class _PooledConnection:
+    """One Web3 connection in the pool, bound to its own sending account"""
+    
+    def __init__(self, w3, account):
+        self.w3 = w3
+        self.account = account
+        self.next_nonce = None
+
+
 class GanacheConnector:
     """
     Connects to Ganache and manages blockchain storage on Ethereum
@@ -75,6 +87,8 @@ class GanacheConnector:
         self.account = None
         self.contract = None
         self.contract_address = None
+        self.gas_price = None
+        self._pool = queue.Queue()
     
     def connect(self):
         """
@@ -84,9 +98,11 @@ class GanacheConnector:
             bool: True if successful
         """
         try:
-            self.w3 = Web3(Web3.HTTPProvider(self.ganache_url))
+            # self.w3 and the pool are only set once the node has answered,
+            # so a failed connect leaves the connector disconnected
+            w3 = self._new_web3()
             
-            if not self.w3.is_connected():
+            if not w3.is_connected():
                 print(f"❌ Cannot connect to Ganache at {self.ganache_url}")
                 print("   Make sure Ganache is running!")
                 return False
@@ -94,23 +110,89 @@ class GanacheConnector:
             print(f"✅ Connected to Ganache at {self.ganache_url}")
             
             # Get first account
-            accounts = self.w3.eth.accounts
+            accounts = w3.eth.accounts
             if not accounts:
                 print("❌ No accounts found in Ganache")
                 return False
             
-            self.account = accounts[config.SERVER_ACCOUNT_INDEX]
-            balance = self.w3.eth.get_balance(self.account)
+            account = accounts[config.SERVER_ACCOUNT_INDEX]
+            balance = w3.eth.get_balance(account)
             
-            print(f"✅ Using account: {self.account}")
-            print(f"   Balance: {self.w3.from_wei(balance, 'ether')} ETH")
+            print(f"✅ Using account: {account}")
+            print(f"   Balance: {w3.from_wei(balance, 'ether')} ETH")
             
+            # Ganache uses a constant gas price and each pooled connection is
+            # the only sender for its account, so both can be cached per tx
+            self.gas_price = w3.eth.gas_price
+            self._fill_pool(w3, accounts)
+            print(f"✅ Opened {self._pool.qsize()} pooled connection(s)")
+            
+            self.w3 = w3
+            self.account = account
             return True
             
         except Exception as e:
             print(f"❌ Connection error: {e}")
             return False
     
+    def _new_web3(self):
+        """Create a Web3 instance with its own HTTP session"""
+        return Web3(Web3.HTTPProvider(self.ganache_url, session=requests.Session()))
+    
+    def _fill_pool(self, w3, accounts):
+        """
+        Open the pooled connections used by store_block
+        
+        The first connection reuses w3 and the server account; the rest
+        take the following Ganache accounts, so no two connections ever
+        share a nonce sequence.
+        
+        Args:
+            w3: Web3 - Connected Web3 instance
+            accounts: list - Accounts reported by Ganache
+        """
+        pool = queue.Queue()
+        pool_accounts = accounts[config.SERVER_ACCOUNT_INDEX:][:config.WEB3_POOL_SIZE]
+        
+        for i, account in enumerate(pool_accounts):
+            conn = _PooledConnection(w3 if i == 0 else self._new_web3(), account)
+            self.refresh_nonce(conn)
+            pool.put(conn)
+        self._pool = pool
+    
+    @contextmanager
+    def _acquire(self):
+        """
+        Borrow a pooled connection, returning it when the block exits
+        
+        Raises:
+            TimeoutError: If none is free within config.WEB3_POOL_TIMEOUT seconds
+        """
+        try:
+            conn = self._pool.get(timeout=config.WEB3_POOL_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError("No pooled Ganache connection available") from None
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+    
+    def refresh_nonce(self, conn):
+        """
+        Re-sync a pooled connection's nonce counter with the node
+        
+        Call this after a failed send, since the cached counter may have
+        been advanced for a transaction the node never accepted.
+        
+        Args:
+            conn: _PooledConnection - Connection to re-sync
+            
+        Returns:
+            int: Next nonce to use
+        """
+        conn.next_nonce = conn.w3.eth.get_transaction_count(conn.account, 'pending')
+        return conn.next_nonce
+    
     def deploy_contract(self):
         """
         Deploy the BlockchainStorage smart contract
@@ -147,7 +229,7 @@ class GanacheConnector:
             block_data: dict - Block data to store
             
         Returns:
-            str: Transaction hash
+            str: Transaction hash (not yet confirmed, see wait_for_receipts)
         """
         if not self.w3:
             print("❌ Not connected to Ganache")
@@ -160,24 +242,68 @@ class GanacheConnector:
             # For this implementation, we'll store in transaction input data
             # This demonstrates the concept - production would use smart contract
             
-            transaction = {
-                'from': self.account,
-                'to': self.account,  # Self-transaction for data storage
-                'value': 0,
-                'data': self.w3.to_hex(text=f"{owner}:{block_json}"),
-                'gas': config.GAS_LIMIT,
-                'gasPrice': self.w3.eth.gas_price
-            }
-            
-            tx_hash = self.w3.eth.send_transaction(transaction)
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            with self._acquire() as conn:
+                transaction = {
+                    'from': conn.account,
+                    'to': conn.account,  # Self-transaction for data storage
+                    'value': 0,
+                    'data': conn.w3.to_hex(text=f"{owner}:{block_json}"),
+                    'gas': config.GAS_LIMIT,
+                    'gasPrice': self.gas_price,
+                    'nonce': conn.next_nonce
+                }
+                
+                try:
+                    tx_hash = conn.w3.eth.send_transaction(transaction)
+                except Exception:
+                    try:
+                        self.refresh_nonce(conn)
+                    except Exception:
+                        pass
+                    raise
+                conn.next_nonce += 1
             
+            # Receipt is not awaited here; use wait_for_receipts for a batch of hashes
             return tx_hash.hex()
             
         except Exception as e:
             print(f"❌ Storage error: {e}")
             return None
     
+    def wait_for_receipts(self, tx_hashes):
+        """
+        Wait for the receipts of transactions sent by store_block
+        
+        On web3 versions with batch_requests all receipts are fetched in one
+        round trip; any that are missing (still pending) are waited on singly.
+        
+        Args:
+            tx_hashes: list of str - Transaction hashes
+            
+        Returns:
+            list: Transaction receipts, in input order
+        """
+        if not self.w3:
+            print("❌ Not connected to Ganache")
+            return []
+        
+        with self._acquire() as conn:
+            w3 = conn.w3
+            receipts = [None] * len(tx_hashes)
+            if tx_hashes and hasattr(w3, 'batch_requests'):
+                try:
+                    with w3.batch_requests() as batch:
+                        for tx_hash in tx_hashes:
+                            batch.add(w3.eth.get_transaction_receipt(tx_hash))
+                        receipts = batch.execute()
+                except Exception:
+                    receipts = [None] * len(tx_hashes)
+            
+            return [
+                receipt or w3.eth.wait_for_transaction_receipt(tx_hash)
+                for tx_hash, receipt in zip(tx_hashes, receipts)
+            ]
+    
     def get_block_count(self, owner):
         """
         Get number of blocks for a user
@@ -274,7 +400,7 @@ def test_ganache_connection():
     
     if tx_hash:
         try:
-            receipt = connector.w3.eth.get_transaction_receipt(tx_hash)
+            receipt = connector.wait_for_receipts([tx_hash])[0]
             print(f"Block number: {receipt['blockNumber']}")
             print(f"Gas used: {receipt['gasUsed']}")
             print(f"Status: {'Success' if receipt['status'] == 1 else 'Failed'}")
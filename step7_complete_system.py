@@ -6,19 +6,55 @@ This module integrates all components into a complete file encryption system.
 """
 
 import os
+import mmap
+import tempfile
+import threading
+import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import json
 
 # Import our modules
 from step2_crypto_aes import AESEncryption
 from step3_crypto_ecc import ECCEncryption
 from step4_dynamic_key_gen import DynamicKeyGenerator
-from step5_blockchain_structure import Blockchain, Block
+from step5_blockchain_structure import Blockchain, Block, dumps_block_data
+from block_data_cache import BlockDataCacheMixin
 import config
 
+# The crypto helpers hold no per-user state, so every storage instance shares one of each
+_AES = AESEncryption()
+_ECC = ECCEncryption()
+_KEYGEN = DynamicKeyGenerator()
 
-class SecureCloudStorage:
+
+class _UUIDPool:
+    """
+    Hands out random (version 4) UUIDs from one os.urandom call per batch
+    
+    Not thread-safe on its own; upload_file only calls next() under the
+    chain lock.
+    """
+    
+    def __init__(self, n=256):
+        self._n = n
+        self._refill()
+    
+    def _refill(self):
+        self._buf = os.urandom(16 * self._n)
+        self._i = 0
+    
+    def next(self):
+        """Return the next UUID, refilling the batch when it runs out"""
+        if self._i == self._n:
+            self._refill()
+        i = self._i
+        self._i += 1
+        return uuid.UUID(bytes=self._buf[i * 16:(i + 1) * 16], version=4)
+
+
+class SecureCloudStorage(BlockDataCacheMixin):
     """
     Complete secure cloud storage system
     
@@ -42,9 +78,16 @@ class SecureCloudStorage:
             user_id: str - Unique user identifier
         """
         self.user_id = user_id
-        self.aes = AESEncryption()
-        self.ecc = ECCEncryption()
-        self.keygen = DynamicKeyGenerator()
+        self.aes = _AES
+        self.ecc = _ECC
+        self.keygen = _KEYGEN
+        self._parse_cache = {}  # block_id -> (block.data, parsed dict)
+        self._chain_lock = threading.Lock()  # Serializes block creation and chain saves
+        self._recipient_pk_cache = {}  # user_id -> recipient public key
+        self._share_secret_cache = {}  # user_id -> (expires_at, derive_shared_secret result)
+        self._aes_key_cache = OrderedDict()  # file_id -> (AES key bytearray, GCM context), LRU order
+        self._key_cache_lock = threading.Lock()
+        self._uuid_pool = _UUIDPool()
         
         # Load or create ECC keys
         self.private_key, self.public_key = self.ecc.load_keys(user_id)
@@ -64,7 +107,7 @@ class SecureCloudStorage:
             self.blockchain.save_to_file()
             print(f"🔗 Created new blockchain for {user_id}")
     
-    def upload_file(self, file_path):
+    def upload_file(self, file_path, defer_save=False):
         """
         Upload and encrypt a file
         
@@ -79,6 +122,7 @@ class SecureCloudStorage:
         
         Args:
             file_path: str or Path - File to upload
+            defer_save: bool - Skip writing the blockchain (caller saves later)
             
         Returns:
             dict: Upload result with file_id and block info
@@ -94,73 +138,126 @@ class SecureCloudStorage:
         print(f"\n📤 Uploading: {file_path.name}")
         print("-" * 80)
         
-        # 1. Read file
+        # 1. Map file into memory (hashed and encrypted without an extra copy)
         with open(file_path, 'rb') as f:
-            file_data = f.read()
-        print(f"✅ Read file: {len(file_data)} bytes")
-        
-        # 2. Get latest block
-        latest_block = self.blockchain.get_latest_block()
-        latest_block_content = latest_block.to_dict()
-        print(f"✅ Got latest block: #{latest_block.block_id}")
-        
-        # 3. Generate dynamic key
-        dynamic_key = self.keygen.generate_dynamic_key(file_data, latest_block_content)
-        print(f"✅ Generated dynamic key: {dynamic_key.hex()[:32]}...")
-        
-        # 4. Encrypt file with AES
-        encrypted_file_data = self.aes.encrypt_file(file_data, dynamic_key)
-        print(f"✅ Encrypted file with AES-256-GCM")
-        
-        # 5. Generate unique file ID
-        file_id = str(uuid.uuid4())
-        
-        # 6. Save encrypted file
-        encrypted_file_path = config.get_file_path(file_id, encrypted=True)
-        encrypted_file_bundle = {
-            'ciphertext': encrypted_file_data['ciphertext'].hex(),
-            'nonce': encrypted_file_data['nonce'].hex(),
-            'tag': encrypted_file_data['tag'].hex(),
-            'original_name': file_path.name
-        }
-        
-        with open(encrypted_file_path, 'w') as f:
-            json.dump(encrypted_file_bundle, f)
-        print(f"✅ Saved encrypted file: {file_id}")
-        
-        # 7. Encrypt the AES key with ECC public key
-        encrypted_key_data = self.ecc.encrypt_data(dynamic_key, self.public_key)
-        
-        # Convert to JSON-serializable format
-        block_data = {
-            'ciphertext': encrypted_key_data['ciphertext'].hex(),
-            'nonce': encrypted_key_data['nonce'].hex(),
-            'tag': encrypted_key_data['tag'].hex(),
-            'encrypted_key': encrypted_key_data['encrypted_key'].hex(),
-            'key_nonce': encrypted_key_data['key_nonce'].hex(),
-            'key_tag': encrypted_key_data['key_tag'].hex(),
-            'ephemeral_public_key': encrypted_key_data['ephemeral_public_key'].hex()
-        }
-        
-        # 8. Add block to blockchain
-        new_block = self.blockchain.add_block(
-            data=json.dumps(block_data),
-            file_id=file_id
-        )
-        print(f"✅ Created block #{new_block.block_id}")
-        
-        # 9. Save blockchain
-        self.blockchain.save_to_file()
-        print(f"✅ Saved blockchain")
+            file_size = os.fstat(f.fileno()).st_size
+            file_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if file_size else None
+        file_data = memoryview(file_map) if file_map else b''
+        print(f"✅ Read file: {file_size} bytes")
+        
+        try:
+            # Hash the file up front, outside the lock below
+            file_hash = self.keygen.generate_file_hash(file_data)
+            
+            # 2-3. Derive the key from the current latest block
+            latest_block = self.blockchain.get_latest_block()
+            latest_block_content = latest_block.to_dict()
+            print(f"✅ Got latest block: #{latest_block.block_id}")
+            
+            dynamic_key = self.keygen.generate_dynamic_key_from_hash(file_hash, latest_block_content)
+            print(f"✅ Generated dynamic key: {dynamic_key.hex()[:32]}...")
+            
+            file_id = str(self._uuid_pool.next())
+            key_context = self.aes.key_context(dynamic_key)
+            
+            # 4. Stream-encrypt the file into a temp container (outside the
+            # lock, so uploads overlap here)
+            encrypted_file_path = config.get_file_path(file_id, encrypted=True)
+            fd, tmp_path = tempfile.mkstemp(dir=encrypted_file_path.parent, prefix=f'.{file_id}.', suffix='.part')
+            os.close(fd)
+            try:
+                self.aes.encrypt_file_to(file_data, dynamic_key, tmp_path, file_path.name,
+                                         context=key_context)
+                print(f"✅ Encrypted file with AES-256-GCM")
+                
+                # 5-6. Encrypt the AES key with ECC public key
+                encrypted_key_data = self.ecc.encrypt_data(dynamic_key, self.public_key)
+                block_data = {
+                    **ECCEncryption.pack_encrypted_data(encrypted_key_data),
+                    'original_name': file_path.name
+                }
+                block_json = dumps_block_data(block_data)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            
+            # 7-8. Publish the container, add its block and journal it. Only
+            # this part is serialized: the journal must stay in block_id
+            # order, and a block must never outlive a failed save. The block
+            # may link after blocks other uploads added meanwhile; its key is
+            # stored in it, so that doesn't affect decryption.
+            with self._chain_lock:
+                new_block = None
+                try:
+                    os.replace(tmp_path, encrypted_file_path)
+                    new_block = self.blockchain.add_block(data=block_json, file_id=file_id)
+                    if not defer_save:
+                        self.blockchain.append_block_to_disk(new_block)
+                except BaseException:
+                    if new_block is not None:
+                        self.blockchain.discard_latest_block()
+                    for path in (tmp_path, encrypted_file_path):
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+                    raise
+            print(f"✅ Saved encrypted file: {file_id}")
+            print(f"✅ Created block #{new_block.block_id}")
+            if not defer_save:
+                print(f"✅ Saved blockchain")
+            
+            self._parse_cache[new_block.block_id] = (new_block.data, block_data)
+            self._cache_aes_key(file_id, dynamic_key, key_context)
+        finally:
+            if file_map:
+                file_data.release()
+                file_map.close()
         
         return {
             'file_id': file_id,
             'original_name': file_path.name,
-            'size': len(file_data),
+            'size': file_size,
             'block_id': new_block.block_id,
             'encrypted_file_path': str(encrypted_file_path)
         }
     
+    def bulk_upload(self, file_paths, max_workers=None):
+        """
+        Upload several files in parallel, writing the blockchain once at the end
+        
+        Hashing, AES encryption and file I/O run concurrently in a thread pool
+        (the crypto backends release the GIL); only adding each block is
+        serialized.
+        Saving after every file would rewrite the whole chain each time, which
+        is quadratic in the number of files.
+        
+        Args:
+            file_paths: iterable of str or Path - Files to upload
+            max_workers: int - Thread count (defaults to CPU count)
+            
+        Returns:
+            list: Upload results, in input order
+        """
+        file_paths = list(file_paths)
+        if not file_paths:
+            return []
+        
+        workers = min(len(file_paths), max_workers or os.cpu_count() or 1)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(self.upload_file, file_path, defer_save=True)
+                    for file_path in file_paths
+                ]
+                results = [future.result() for future in futures]
+        finally:
+            with self._chain_lock:
+                self.blockchain.save_to_file()
+            print(f"✅ Saved blockchain")
+        
+        return results
+    
     def download_file(self, file_id, output_path=None):
         """
         Download and decrypt a file
@@ -182,53 +279,23 @@ class SecureCloudStorage:
         print(f"\n📥 Downloading: {file_id}")
         print("-" * 80)
         
-        # 1. Get block
-        block = self.blockchain.get_block_by_file_id(file_id)
-        if not block:
-            raise ValueError(f"File not found: {file_id}")
-        print(f"✅ Found block #{block.block_id}")
-        
-        # 2. Decrypt block to get AES key
-        block_data = json.loads(block.data)
-        
-        # Reconstruct encrypted data structure
-        encrypted_key_data = {
-            'ciphertext': bytes.fromhex(block_data['ciphertext']),
-            'nonce': bytes.fromhex(block_data['nonce']),
-            'tag': bytes.fromhex(block_data['tag']),
-            'encrypted_key': bytes.fromhex(block_data['encrypted_key']),
-            'key_nonce': bytes.fromhex(block_data['key_nonce']),
-            'key_tag': bytes.fromhex(block_data['key_tag']),
-            'ephemeral_public_key': bytes.fromhex(block_data['ephemeral_public_key'])
-        }
+        # 1-2. Get the file's AES key (decrypting its block on a cache miss)
+        dynamic_key, key_context = self._get_aes_key_context(file_id)
+        print(f"✅ Got AES key for file")
         
-        # Decrypt with private key
-        dynamic_key = self.ecc.decrypt_data(encrypted_key_data, self.private_key)
-        print(f"✅ Decrypted AES key from block")
-        
-        # 3. Load encrypted file
+        # 3. Read the encrypted file's header (the ciphertext is streamed below)
         encrypted_file_path = config.get_file_path(file_id, encrypted=True)
-        with open(encrypted_file_path, 'r') as f:
-            encrypted_file_bundle = json.load(f)
-        
-        # 4. Decrypt file
-        encrypted_file_data = {
-            'ciphertext': bytes.fromhex(encrypted_file_bundle['ciphertext']),
-            'nonce': bytes.fromhex(encrypted_file_bundle['nonce']),
-            'tag': bytes.fromhex(encrypted_file_bundle['tag'])
-        }
-        
-        decrypted_data = self.aes.decrypt_file(encrypted_file_data, dynamic_key)
-        print(f"✅ Decrypted file: {len(decrypted_data)} bytes")
+        header = AESEncryption.load_encrypted_header(encrypted_file_path)
         
-        # 5. Save decrypted file
         if output_path is None:
-            output_path = config.FILES_DIR / encrypted_file_bundle['original_name']
+            output_path = config.FILES_DIR / header['original_name']
         else:
             output_path = Path(output_path)
         
-        with open(output_path, 'wb') as f:
-            f.write(decrypted_data)
+        # 4-5. Decrypt into the output file, chunk by chunk
+        size = self.aes.decrypt_file_to(encrypted_file_path, dynamic_key, output_path, header,
+                                        context=key_context)
+        print(f"✅ Decrypted file: {size} bytes")
         print(f"✅ Saved to: {output_path}")
         
         return output_path
@@ -237,21 +304,26 @@ class SecureCloudStorage:
         """
         List all uploaded files
         
+        File names are read from the blocks themselves, so listing does not
+        open the encrypted files (except for blocks written before the name
+        was stored on-chain).
+        
         Returns:
             list: File information
         """
         files = []
+        existing = config.list_encrypted_file_ids()
         
         for block in self.blockchain.chain[1:]:  # Skip genesis
-            encrypted_path = config.get_file_path(block.file_id, encrypted=True)
-            
-            if encrypted_path.exists():
-                with open(encrypted_path, 'r') as f:
-                    bundle = json.load(f)
+            if block.file_id in existing:
+                encrypted_path = config.get_file_path(block.file_id, encrypted=True)
+                name = self._parsed(block).get('original_name')
+                if name is None:
+                    name = AESEncryption.load_encrypted_header(encrypted_path)['original_name']
                 
                 files.append({
                     'file_id': block.file_id,
-                    'name': bundle['original_name'],
+                    'name': name,
                     'block_id': block.block_id,
                     'timestamp': block.timestamp
                 })
@@ -279,44 +351,28 @@ class SecureCloudStorage:
         print("-" * 80)
         
         # 1. Get recipient's public key
-        recipient_ecc = ECCEncryption()
-        _, recipient_public_key = recipient_ecc.load_keys(recipient_user_id)
-        
-        if not recipient_public_key:
-            raise ValueError(f"Recipient {recipient_user_id} not found (no public key)")
+        recipient_public_key = self._recipient_pk_cache.get(recipient_user_id)
+        if recipient_public_key is None:
+            _, recipient_public_key = self.ecc.load_keys(recipient_user_id)
+            
+            if not recipient_public_key:
+                raise ValueError(f"Recipient {recipient_user_id} not found (no public key)")
+            self._recipient_pk_cache[recipient_user_id] = recipient_public_key
         
         print(f"✅ Got recipient's public key")
         
-        # 2. Get our block and decrypt to get AES key
-        block = self.blockchain.get_block_by_file_id(file_id)
-        if not block:
-            raise ValueError(f"File not found: {file_id}")
-        
-        block_data = json.loads(block.data)
-        encrypted_key_data = {
-            'ciphertext': bytes.fromhex(block_data['ciphertext']),
-            'nonce': bytes.fromhex(block_data['nonce']),
-            'tag': bytes.fromhex(block_data['tag']),
-            'encrypted_key': bytes.fromhex(block_data['encrypted_key']),
-            'key_nonce': bytes.fromhex(block_data['key_nonce']),
-            'key_tag': bytes.fromhex(block_data['key_tag']),
-            'ephemeral_public_key': bytes.fromhex(block_data['ephemeral_public_key'])
-        }
-        
-        aes_key = self.ecc.decrypt_data(encrypted_key_data, self.private_key)
+        # 2. Get file's AES key, decrypting our block only if it isn't cached
+        aes_key = self._get_aes_key(file_id)
         print(f"✅ Retrieved AES key")
         
-        # 3. Encrypt AES key for recipient
-        shared_key_data = recipient_ecc.encrypt_data(aes_key, recipient_public_key)
+        # 3. Encrypt AES key for recipient, reusing a recent ECDH secret
+        shared_key_data = self.ecc.encrypt_data(
+            aes_key, recipient_public_key,
+            shared_secret=self._share_secret(recipient_user_id, recipient_public_key)
+        )
         
         shared_block_data = {
-            'ciphertext': shared_key_data['ciphertext'].hex(),
-            'nonce': shared_key_data['nonce'].hex(),
-            'tag': shared_key_data['tag'].hex(),
-            'encrypted_key': shared_key_data['encrypted_key'].hex(),
-            'key_nonce': shared_key_data['key_nonce'].hex(),
-            'key_tag': shared_key_data['key_tag'].hex(),
-            'ephemeral_public_key': shared_key_data['ephemeral_public_key'].hex(),
+            **ECCEncryption.pack_encrypted_data(shared_key_data),
             'shared_from': self.user_id,
             'original_file_id': file_id
         }
@@ -331,6 +387,93 @@ class SecureCloudStorage:
             'sender': self.user_id
         }
     
+    def clear_key_cache(self):
+        """
+        Forget cached AES keys and ECDH secrets
+        
+        Call this when the user logs out so plaintext keys don't outlive
+        the session.
+        """
+        with self._key_cache_lock:
+            for key, _ in self._aes_key_cache.values():
+                key[:] = bytes(len(key))
+            self._aes_key_cache.clear()
+        self._share_secret_cache.clear()
+    
+    def _cache_aes_key(self, file_id, key, context=None):
+        """
+        Remember a file's AES key and GCM context, evicting the least
+        recently used past KEY_CACHE_SIZE
+        
+        Args:
+            file_id: str - File identifier
+            key: bytes - 32-byte AES key
+            context: Already-built GCM context for key (built here if None)
+        
+        Returns:
+            The key's reusable GCM context (None without OpenSSL GCM)
+        """
+        if context is None:
+            context = AESEncryption.key_context(key)
+        with self._key_cache_lock:
+            self._aes_key_cache[file_id] = (bytearray(key), context)
+            self._aes_key_cache.move_to_end(file_id)
+            while len(self._aes_key_cache) > config.KEY_CACHE_SIZE:
+                _, (evicted, _) = self._aes_key_cache.popitem(last=False)
+                evicted[:] = bytes(len(evicted))  # Best effort; callers may hold copies
+        return context
+    
+    def _get_aes_key(self, file_id):
+        """
+        Get a file's AES key, decrypting it from its block on a cache miss
+        
+        Args:
+            file_id: str - File identifier
+            
+        Returns:
+            bytes: 32-byte AES key
+        """
+        return self._get_aes_key_context(file_id)[0]
+    
+    def _get_aes_key_context(self, file_id):
+        """
+        Get a file's AES key and its cached GCM context
+        
+        Args:
+            file_id: str - File identifier
+            
+        Returns:
+            tuple: (32-byte AES key, GCM context or None)
+        """
+        with self._key_cache_lock:
+            cached = self._aes_key_cache.get(file_id)
+            if cached is not None:
+                self._aes_key_cache.move_to_end(file_id)
+                return bytes(cached[0]), cached[1]
+        
+        block = self.blockchain.get_block_by_file_id(file_id)
+        if not block:
+            raise ValueError(f"File not found: {file_id}")
+        
+        encrypted_key_data = ECCEncryption.unpack_encrypted_data(self._parsed(block))
+        aes_key = self.ecc.decrypt_data(encrypted_key_data, self.private_key)
+        return aes_key, self._cache_aes_key(file_id, aes_key)
+    
+    def _share_secret(self, recipient_user_id, recipient_public_key):
+        """
+        Get the ECDH secret for a recipient, deriving a new one once the
+        previous one is older than config.SHARE_SECRET_TTL
+        """
+        now = time.monotonic()
+        cached = self._share_secret_cache.get(recipient_user_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        
+        secret = self.ecc.derive_shared_secret(recipient_public_key)
+        if config.SHARE_SECRET_TTL > 0:
+            self._share_secret_cache[recipient_user_id] = (now + config.SHARE_SECRET_TTL, secret)
+        return secret
+    
     def get_public_key_hex(self):
         """Get public key as hex string for sharing"""
         return ECCEncryption.public_key_to_string(self.public_key)
@@ -410,13 +553,15 @@ Using dynamic AES encryption with blockchain key management.
     print("\n📝 Test 5: Upload Multiple Files")
     print("-" * 80)
     
+    test_files = []
     for i in range(3):
         test_file_i = config.FILES_DIR / f"file_{i}.txt"
         with open(test_file_i, 'w') as f:
             f.write(f"Content of file {i}")
-        
-        result = storage.upload_file(test_file_i)
-        print(f"✅ Uploaded file_{i}.txt → Block #{result['block_id']}")
+        test_files.append(test_file_i)
+    
+    for result in storage.bulk_upload(test_files):
+        print(f"✅ Uploaded {result['original_name']} → Block #{result['block_id']}")
     
     print(f"\n📊 Blockchain now has {len(storage.blockchain)} blocks")
     
@@ -7,15 +7,103 @@ This is an interactive command-line demo of the secure cloud storage system.
 
 from step7_complete_system import SecureCloudStorage
 import config
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 
 
+class _JobOutput:
+    """
+    sys.stdout stand-in that holds back what background jobs print
+    
+    Writes from a thread inside capture() go to that job's buffer; all
+    other writes (the menu and its prompts) pass straight through.
+    """
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._buffers = {}  # thread id -> io.StringIO
+    
+    def write(self, text):
+        buffer = self._buffers.get(threading.get_ident())
+        if buffer is None:
+            return self._stream.write(text)
+        return buffer.write(text)
+    
+    def flush(self):
+        self._stream.flush()
+    
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+    
+    @contextmanager
+    def capture(self, buffer):
+        """Collect this thread's output in buffer until the block exits"""
+        self._buffers[threading.get_ident()] = buffer
+        try:
+            yield
+        finally:
+            del self._buffers[threading.get_ident()]
+
+
 class DemoApp:
     """Interactive demo application"""
     
     def __init__(self):
         self.storage = None
         self.current_user = None
+        # Uploads and downloads run here so the menu stays usable meanwhile
+        self._pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+        self._jobs = []  # (description, future, on_success, captured output)
+        self._output = _JobOutput(sys.stdout)  # Installed as sys.stdout by run()
+        self._files_cache = None  # storage.list_files(), until an upload/share/login
+    
+    def _submit(self, description, on_success, fn, *args):
+        """Run fn(*args) in the background; on_success gets its result"""
+        buffer = io.StringIO()
+        future = self._pool.submit(self._run_job, buffer, fn, *args)
+        self._jobs.append((description, future, on_success, buffer))
+        print(f"⏳ {description} started in the background")
+    
+    def _run_job(self, buffer, fn, *args):
+        """Run fn(*args), holding its output back for _report_jobs"""
+        with self._output.capture(buffer):
+            return fn(*args)
+    
+    def _report_jobs(self):
+        """Print the outcome of background jobs that have finished"""
+        pending = []
+        for job in self._jobs:
+            description, future, on_success, buffer = job
+            if not future.done():
+                pending.append(job)
+                continue
+            print(buffer.getvalue(), end='')
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ {description} failed: {e}")
+            else:
+                on_success(result)
+        self._jobs = pending
+    
+    def _wait_for_jobs(self):
+        """Block until every background job has finished"""
+        if self._jobs:
+            print(f"⏳ Waiting for {len(self._jobs)} background job(s)...")
+        for job in self._jobs:
+            job[1].exception()
+        self._report_jobs()
+    
+    def _files(self):
+        """Return the current user's files, listing storage only when stale"""
+        if self._files_cache is None:
+            self._files_cache = self.storage.list_files()
+        return self._files_cache
     
     def print_header(self):
         """Print application header"""
@@ -27,6 +115,8 @@ class DemoApp:
         if self.current_user:
             print(f"👤 User: {self.current_user}")
             print(f"🔗 Blockchain: {len(self.storage.blockchain)} blocks")
+            if self._jobs:
+                print(f"⏳ Background jobs running: {len(self._jobs)}")
             print("=" * 80)
     
     def print_menu(self):
@@ -50,8 +140,12 @@ class DemoApp:
                 user_id = "demo_user"
         
         print(f"\n🔐 Logging in as {user_id}...")
+        if self.storage is not None:
+            self._wait_for_jobs()
+            self.storage.clear_key_cache()
         self.storage = SecureCloudStorage(user_id)
         self.current_user = user_id
+        self._files_cache = None
         print(f"✅ Logged in successfully!")
     
     def upload_file(self):
@@ -70,14 +164,16 @@ class DemoApp:
             file_path = str(test_file)
             print(f"📝 Created test file: {test_file.name}")
         
-        try:
-            result = self.storage.upload_file(file_path)
-            print(f"\n✅ Upload successful!")
-            print(f"   File ID: {result['file_id']}")
-            print(f"   Block: #{result['block_id']}")
-            print(f"   Size: {result['size']} bytes")
-        except Exception as e:
-            print(f"❌ Upload failed: {e}")
+        self._submit(f"Upload of {Path(file_path).name}", self._print_upload_result,
+                     self.storage.upload_file, file_path)
+    
+    def _print_upload_result(self, result):
+        """Report a finished upload"""
+        self._files_cache = None
+        print(f"\n✅ Upload successful: {result['original_name']}")
+        print(f"   File ID: {result['file_id']}")
+        print(f"   Block: #{result['block_id']}")
+        print(f"   Size: {result['size']} bytes")
     
     def download_file(self):
         """Download file menu"""
@@ -85,7 +181,7 @@ class DemoApp:
         print("-" * 80)
         
         # Show available files
-        files = self.storage.list_files()
+        files = self._files()
         if not files:
             print("No files available")
             return
@@ -106,18 +202,22 @@ class DemoApp:
             if not output_path:
                 output_path = None
             
-            downloaded = self.storage.download_file(file_id, output_path)
-            print(f"\n✅ Downloaded to: {downloaded}")
+            self._submit(f"Download of {file_id[:8]}...", self._print_download_result,
+                         self.storage.download_file, file_id, output_path)
             
         except Exception as e:
             print(f"❌ Download failed: {e}")
     
+    def _print_download_result(self, downloaded):
+        """Report a finished download"""
+        print(f"\n✅ Downloaded to: {downloaded}")
+    
     def list_files(self):
         """List all files"""
         print("\n📁 YOUR FILES")
         print("-" * 80)
         
-        files = self.storage.list_files()
+        files = self._files()
         
         if not files:
             print("No files uploaded yet")
@@ -137,7 +237,7 @@ class DemoApp:
         print("-" * 80)
         
         # Show files
-        files = self.storage.list_files()
+        files = self._files()
         if not files:
             print("No files to share")
             return
@@ -164,6 +264,7 @@ class DemoApp:
             recipient_storage = SecureCloudStorage(recipient)
             
             share_info = self.storage.share_file(file_id, recipient)
+            self._files_cache = None
             print(f"\n✅ File shared with {recipient}!")
             print(f"   They can now access the file securely")
             
@@ -209,7 +310,7 @@ class DemoApp:
         print(f"  Public Key: {self.storage.get_public_key_hex()[:64]}...")
         
         print(f"\n📁 Storage:")
-        files = self.storage.list_files()
+        files = self._files()
         print(f"  Files: {len(files)}")
         print(f"  Blocks: {len(self.storage.blockchain)}")
         
@@ -223,12 +324,21 @@ class DemoApp:
     
     def run(self):
         """Run the demo application"""
+        stdout, sys.stdout = sys.stdout, self._output
+        try:
+            self._run()
+        finally:
+            sys.stdout = stdout
+    
+    def _run(self):
+        """Menu loop (background job output is held back while it runs)"""
         self.print_header()
         
         # Login
         self.login()
         
         while True:
+            self._report_jobs()
             self.print_header()
             self.print_menu()
             
@@ -249,6 +359,8 @@ class DemoApp:
             elif choice == '7':
                 self.system_info()
             elif choice == '0':
+                self._wait_for_jobs()
+                self._pool.shutdown()
                 print("\n👋 Goodbye!")
                 break
             else:
@@ -7,19 +7,143 @@ Also includes proper Ganache integration.
 """
 
 import os
+import json
+import threading
 import uuid
 from pathlib import Path
-import json
 
 # Import our modules
 from step2_crypto_aes import AESEncryption
 from step3_crypto_ecc import ECCEncryption
 from step4_dynamic_key_gen import DynamicKeyGenerator
-from step5_blockchain_structure import Blockchain, Block
+from step5_blockchain_structure import Blockchain, Block, dumps_block_data
+from block_data_cache import BlockDataCacheMixin
 import config
 
 
-class SecureCloudStorage:
+# Share records already parsed from shares.jsonl, so repeated loads only
+# read lines appended since the last call
+_share_log = {'stamp': None, 'offset': 0, 'records': []}
+_share_log_lock = threading.Lock()  # Guards shares.jsonl appends and _share_log
+
+
+def append_share_record(record):
+    """
+    Record a file share in data/shares.jsonl
+    
+    One JSON object per line, so adding a share is a single append rather
+    than rewriting the whole history.
+    
+    Args:
+        record: dict - Sharing record (file_id, sender, recipient, ...)
+    """
+    line = (json.dumps(record) + '\n').encode('utf-8')
+    with _share_log_lock:
+        with open(config.DATA_DIR / 'shares.jsonl', 'ab') as f:
+            f.write(line)
+
+
+def _read_share_log():
+    """
+    Return the records in data/shares.jsonl, parsing only new lines
+    
+    A partially written last line (interrupted append) is left for the
+    next call rather than failing the whole load. Caller must hold
+    _share_log_lock.
+    """
+    path = config.DATA_DIR / 'shares.jsonl'
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        _share_log.update(stamp=None, offset=0, records=[])
+        return []
+    
+    if _share_log['stamp'] != st.st_ino or st.st_size < _share_log['offset']:
+        # New or truncated file: start over
+        _share_log.update(stamp=st.st_ino, offset=0, records=[])
+    
+    if st.st_size > _share_log['offset']:
+        with open(path, 'rb') as f:
+            f.seek(_share_log['offset'])
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                _share_log['records'].append(json.loads(line))
+        _share_log['offset'] += end
+    
+    return _share_log['records']
+
+
+def load_share_records():
+    """
+    Load all sharing records
+    
+    Includes records from the older data/shares.json array, if present.
+    
+    Returns:
+        list of sharing record dicts, oldest first
+    """
+    shares = []
+    legacy_path = config.DATA_DIR / 'shares.json'
+    if legacy_path.exists():
+        with open(legacy_path, 'r') as f:
+            shares.extend(json.load(f))
+    
+    with _share_log_lock:
+        shares.extend(_read_share_log())
+    return shares
+
+
+class RecipientHandle:
+    """
+    The parts of another user's storage that share_file needs
+    
+    Holds the recipient's public key and, loaded on first use, their
+    blockchain. The chain is only re-read from disk when its file has
+    changed since this handle last saw it.
+    """
+    
+    def __init__(self, user_id, public_key):
+        self.user_id = user_id
+        self.public_key = public_key
+        self._blockchain = None
+        self._stamp = None
+    
+    def _current_blockchain(self):
+        """Recipient's blockchain, reloaded only if another writer touched it"""
+        blockchain_path = config.get_blockchain_path(self.user_id)
+        stamp = Blockchain.file_stamp(blockchain_path)
+        
+        if self._blockchain is None or stamp != self._stamp:
+            if stamp is None:
+                self._blockchain = Blockchain(self.user_id)
+                self._blockchain.create_genesis_block()
+                self._blockchain.save_to_file()
+            else:
+                self._blockchain = Blockchain.load_from_file(blockchain_path)
+            self._stamp = Blockchain.file_stamp(blockchain_path)
+        return self._blockchain
+    
+    def append_block(self, data, file_id):
+        """
+        Add a block to the recipient's blockchain and persist it
+        
+        Args:
+            data: str - Block data
+            file_id: str - File identifier
+            
+        Returns:
+            Block: The new block
+        """
+        blockchain = self._current_blockchain()
+        new_block = blockchain.add_block(data=data, file_id=file_id)
+        blockchain.append_block_to_disk(new_block)
+        self._stamp = Blockchain.file_stamp(config.get_blockchain_path(self.user_id))
+        return new_block
+
+
+class SecureCloudStorage(BlockDataCacheMixin):
     """
     Complete secure cloud storage system with proper file sharing
     """
@@ -30,6 +154,9 @@ class SecureCloudStorage:
         self.aes = AESEncryption()
         self.ecc = ECCEncryption()
         self.keygen = DynamicKeyGenerator()
+        self._parse_cache = {}  # block_id -> (block.data, parsed dict)
+        self._key_data_cache = {}  # block_id -> (block.data, decoded encrypted key)
+        self._recipients = {}  # user_id -> RecipientHandle
         
         # Load or create ECC keys
         self.private_key, self.public_key = self.ecc.load_keys(user_id)
@@ -48,6 +175,19 @@ class SecureCloudStorage:
             self.blockchain.create_genesis_block()
             self.blockchain.save_to_file()
             print(f"🔗 Created new blockchain for {user_id}")
+        self._chain_stamp = self._blockchain_file_stamp()
+    
+    def _blockchain_file_stamp(self):
+        """Change marker for our saved blockchain (see Blockchain.file_stamp)"""
+        return Blockchain.file_stamp(config.get_blockchain_path(self.user_id))
+    
+    def _refresh_blockchain(self):
+        """Reload blockchain if another session (e.g. a share) has written it"""
+        stamp = self._blockchain_file_stamp()
+        if stamp is not None and stamp != self._chain_stamp:
+            self.blockchain = Blockchain.load_from_file(config.get_blockchain_path(self.user_id))
+            self._chain_stamp = stamp
+            print(f"🔄 Reloaded blockchain with {len(self.blockchain)} blocks")
     
     def upload_file(self, file_path):
         """Upload and encrypt a file"""
@@ -67,7 +207,8 @@ class SecureCloudStorage:
             file_data = f.read()
         print(f"✅ Read file: {len(file_data)} bytes")
         
-        # Get latest block
+        # Get latest block (from disk if a share has added one since we loaded)
+        self._refresh_blockchain()
         latest_block = self.blockchain.get_latest_block()
         latest_block_content = latest_block.to_dict()
         print(f"✅ Got latest block: #{latest_block.block_id}")
@@ -76,51 +217,37 @@ class SecureCloudStorage:
         dynamic_key = self.keygen.generate_dynamic_key(file_data, latest_block_content)
         print(f"✅ Generated dynamic key: {dynamic_key.hex()[:32]}...")
         
-        # Encrypt file with AES
-        encrypted_file_data = self.aes.encrypt_file(file_data, dynamic_key)
-        print(f"✅ Encrypted file with AES-256-GCM")
-        
         # Generate unique file ID
         file_id = str(uuid.uuid4())
         
-        # Save encrypted file
+        # Encrypt file with AES straight into its binary container
         encrypted_file_path = config.get_file_path(file_id, encrypted=True)
-        encrypted_file_bundle = {
-            'ciphertext': encrypted_file_data['ciphertext'].hex(),
-            'nonce': encrypted_file_data['nonce'].hex(),
-            'tag': encrypted_file_data['tag'].hex(),
-            'original_name': file_path.name
-        }
-        
-        with open(encrypted_file_path, 'w') as f:
-            json.dump(encrypted_file_bundle, f)
+        self.aes.encrypt_file_to(file_data, dynamic_key, encrypted_file_path, file_path.name)
+        print(f"✅ Encrypted file with AES-256-GCM")
         print(f"✅ Saved encrypted file: {file_id}")
         
         # Encrypt the AES key with ECC public key
         encrypted_key_data = self.ecc.encrypt_data(dynamic_key, self.public_key)
         
-        # Convert to JSON-serializable format
+        # Convert to JSON-serializable format (base64 key fields)
         block_data = {
-            'ciphertext': encrypted_key_data['ciphertext'].hex(),
-            'nonce': encrypted_key_data['nonce'].hex(),
-            'tag': encrypted_key_data['tag'].hex(),
-            'encrypted_key': encrypted_key_data['encrypted_key'].hex(),
-            'key_nonce': encrypted_key_data['key_nonce'].hex(),
-            'key_tag': encrypted_key_data['key_tag'].hex(),
-            'ephemeral_public_key': encrypted_key_data['ephemeral_public_key'].hex(),
+            **ECCEncryption.pack_encrypted_data(encrypted_key_data),
             'is_shared': False,
-            'owner': self.user_id
+            'owner': self.user_id,
+            'original_name': file_path.name
         }
         
         # Add block to blockchain
         new_block = self.blockchain.add_block(
-            data=json.dumps(block_data),
+            data=dumps_block_data(block_data),
             file_id=file_id
         )
+        self._key_data_cache[new_block.block_id] = (new_block.data, encrypted_key_data)
         print(f"✅ Created block #{new_block.block_id}")
         
-        # Save blockchain
-        self.blockchain.save_to_file()
+        # Save blockchain (appends just the new block)
+        self.blockchain.append_block_to_disk(new_block)
+        self._chain_stamp = self._blockchain_file_stamp()
         print(f"✅ Saved blockchain")
         
         return {
@@ -142,47 +269,25 @@ class SecureCloudStorage:
             raise ValueError(f"File not found: {file_id}")
         print(f"✅ Found block #{block.block_id}")
         
-        # Decrypt block to get AES key
-        block_data = json.loads(block.data)
-        
-        # Reconstruct encrypted data structure
-        encrypted_key_data = {
-            'ciphertext': bytes.fromhex(block_data['ciphertext']),
-            'nonce': bytes.fromhex(block_data['nonce']),
-            'tag': bytes.fromhex(block_data['tag']),
-            'encrypted_key': bytes.fromhex(block_data['encrypted_key']),
-            'key_nonce': bytes.fromhex(block_data['key_nonce']),
-            'key_tag': bytes.fromhex(block_data['key_tag']),
-            'ephemeral_public_key': bytes.fromhex(block_data['ephemeral_public_key'])
-        }
+        # Decrypt block to get AES key (decoded key fields are memoized)
+        encrypted_key_data = self._encrypted_key_data(block)
         
         # Decrypt with private key
         dynamic_key = self.ecc.decrypt_data(encrypted_key_data, self.private_key)
         print(f"✅ Decrypted AES key from block")
         
-        # Load encrypted file
+        # Read encrypted file header (the ciphertext is streamed below)
         encrypted_file_path = config.get_file_path(file_id, encrypted=True)
-        with open(encrypted_file_path, 'r') as f:
-            encrypted_file_bundle = json.load(f)
-        
-        # Decrypt file
-        encrypted_file_data = {
-            'ciphertext': bytes.fromhex(encrypted_file_bundle['ciphertext']),
-            'nonce': bytes.fromhex(encrypted_file_bundle['nonce']),
-            'tag': bytes.fromhex(encrypted_file_bundle['tag'])
-        }
+        header = AESEncryption.load_encrypted_header(encrypted_file_path)
         
-        decrypted_data = self.aes.decrypt_file(encrypted_file_data, dynamic_key)
-        print(f"✅ Decrypted file: {len(decrypted_data)} bytes")
-        
-        # Save decrypted file
         if output_path is None:
-            output_path = config.FILES_DIR / encrypted_file_bundle['original_name']
+            output_path = config.FILES_DIR / header['original_name']
         else:
             output_path = Path(output_path)
         
-        with open(output_path, 'wb') as f:
-            f.write(decrypted_data)
+        # Decrypt into the output file
+        size = self.aes.decrypt_file_to(encrypted_file_path, dynamic_key, output_path, header)
+        print(f"✅ Decrypted file: {size} bytes")
         print(f"✅ Saved to: {output_path}")
         
         return output_path
@@ -197,23 +302,28 @@ class SecureCloudStorage:
         Returns:
             list: File information
         """
+        self._refresh_blockchain()
+        
         files = []
+        existing = config.list_encrypted_file_ids()
         
         for block in self.blockchain.chain[1:]:  # Skip genesis
-            encrypted_path = config.get_file_path(block.file_id, encrypted=True)
-            
-            if encrypted_path.exists():
-                with open(encrypted_path, 'r') as f:
-                    bundle = json.load(f)
+            if block.file_id in existing:
+                encrypted_path = config.get_file_path(block.file_id, encrypted=True)
                 
                 # Get block data to check if shared
-                block_data = json.loads(block.data)
+                block_data = self._parsed(block)
                 is_shared = block_data.get('is_shared', False)
                 shared_from = block_data.get('shared_from', None)
                 
+                # Blocks carry the file name; older ones need the encrypted file's header
+                name = block_data.get('original_name')
+                if name is None:
+                    name = AESEncryption.load_encrypted_header(encrypted_path)['original_name']
+                
                 files.append({
                     'file_id': block.file_id,
-                    'name': bundle['original_name'],
+                    'name': name,
                     'block_id': block.block_id,
                     'timestamp': block.timestamp,
                     'is_shared': is_shared,
@@ -232,55 +342,43 @@ class SecureCloudStorage:
         print(f"\n🤝 Sharing {file_id} with {recipient_user_id}")
         print("-" * 80)
         
-        # 1. Get recipient's storage instance
-        recipient_storage = SecureCloudStorage(recipient_user_id)
+        # 1. Get recipient's public key and chain (reused across shares)
+        recipient = self._recipients.get(recipient_user_id)
+        if recipient is None:
+            recipient = self.open_for_share(recipient_user_id)
+            self._recipients[recipient_user_id] = recipient
         
         # 2. Get our block and decrypt to get AES key
         block = self.blockchain.get_block_by_file_id(file_id)
         if not block:
             raise ValueError(f"File not found: {file_id}")
         
-        block_data = json.loads(block.data)
-        encrypted_key_data = {
-            'ciphertext': bytes.fromhex(block_data['ciphertext']),
-            'nonce': bytes.fromhex(block_data['nonce']),
-            'tag': bytes.fromhex(block_data['tag']),
-            'encrypted_key': bytes.fromhex(block_data['encrypted_key']),
-            'key_nonce': bytes.fromhex(block_data['key_nonce']),
-            'key_tag': bytes.fromhex(block_data['key_tag']),
-            'ephemeral_public_key': bytes.fromhex(block_data['ephemeral_public_key'])
-        }
+        block_data = self._parsed(block)
+        encrypted_key_data = self._encrypted_key_data(block)
         
         aes_key = self.ecc.decrypt_data(encrypted_key_data, self.private_key)
         print(f"✅ Retrieved AES key")
         
         # 3. Encrypt AES key for recipient
-        shared_key_data = recipient_storage.ecc.encrypt_data(aes_key, recipient_storage.public_key)
+        shared_key_data = self.ecc.encrypt_data(aes_key, recipient.public_key)
         
         shared_block_data = {
-            'ciphertext': shared_key_data['ciphertext'].hex(),
-            'nonce': shared_key_data['nonce'].hex(),
-            'tag': shared_key_data['tag'].hex(),
-            'encrypted_key': shared_key_data['encrypted_key'].hex(),
-            'key_nonce': shared_key_data['key_nonce'].hex(),
-            'key_tag': shared_key_data['key_tag'].hex(),
-            'ephemeral_public_key': shared_key_data['ephemeral_public_key'].hex(),
+            **ECCEncryption.pack_encrypted_data(shared_key_data),
             'is_shared': True,
             'shared_from': self.user_id,
             'original_file_id': file_id,
             'owner': recipient_user_id
         }
+        if 'original_name' in block_data:
+            shared_block_data['original_name'] = block_data['original_name']
         
         print(f"✅ Encrypted key for recipient")
         
-        # 4. Add block to recipient's blockchain (THIS IS THE KEY FIX!)
-        new_block = recipient_storage.blockchain.add_block(
-            data=json.dumps(shared_block_data),
+        # 4-5. Add block to recipient's blockchain and save it (THIS IS THE KEY FIX!)
+        new_block = recipient.append_block(
+            data=dumps_block_data(shared_block_data),
             file_id=file_id  # Same file_id so they access the same encrypted file
         )
-        
-        # 5. Save recipient's blockchain
-        recipient_storage.blockchain.save_to_file()
         print(f"✅ Added to {recipient_user_id}'s blockchain (Block #{new_block.block_id})")
         
         # 6. Create a sharing record
@@ -293,23 +391,32 @@ class SecureCloudStorage:
         }
         
         # Save sharing record for tracking
-        shares_path = config.DATA_DIR / 'shares.json'
-        if shares_path.exists():
-            with open(shares_path, 'r') as f:
-                shares = json.load(f)
-        else:
-            shares = []
-        
-        shares.append(share_record)
-        
-        with open(shares_path, 'w') as f:
-            json.dump(shares, f, indent=2)
+        append_share_record(share_record)
         
         print(f"✅ File successfully shared with {recipient_user_id}!")
         print(f"   They can now see it in their file list (marked as 'shared')")
         
         return share_record
     
+    @classmethod
+    def open_for_share(cls, user_id):
+        """
+        Get a RecipientHandle for a user without loading their storage
+        
+        Users who have never logged in have no keys yet; they are set up
+        once through the full constructor.
+        
+        Args:
+            user_id: str - Recipient user ID
+            
+        Returns:
+            RecipientHandle
+        """
+        public_key = ECCEncryption.load_public_key(user_id)
+        if public_key is None:
+            public_key = cls(user_id).public_key
+        return RecipientHandle(user_id, public_key)
+    
     def get_public_key_hex(self):
         """Get public key as hex string for sharing"""
         return ECCEncryption.public_key_to_string(self.public_key)
@@ -13,78 +13,104 @@ This test exercises all novelty features:
 7. Signature verification on download
 """
 
-import requests
-import json
+import base64
+import hashlib
 import time
-import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from urllib.parse import urlencode
 
-try:
-    from nacl.signing import SigningKey
-    from nacl.encoding import Base64Encoder
-    HAS_NACL = True
-except ImportError:
-    HAS_NACL = False
+from api_test_client import (
+    HAS_NACL, new_session, post_json, read_json, seeded_key, sign_request
+)
+
+if not HAS_NACL:
     print("[!] PyNaCl not available - skipping signed requests")
 
+# Device keypairs from fixed test seeds
+ALICE_KEY, ALICE_PUB_B64 = seeded_key(0x01)
+BOB_KEY, BOB_PUB_B64 = seeded_key(0x02)
+if HAS_NACL:
+    ALICE_PUB_HEX = ALICE_KEY.verify_key.encode().hex()
+
 BASE = "http://localhost:5000"
 
+# Endpoint URLs, built once
+LOGIN_URL = f"{BASE}/api/login"
+REGISTER_DEVICE_URL = f"{BASE}/api/acl/register_device"
+UPLOAD_URL = f"{BASE}/api/upload"
+GRANT_URL = f"{BASE}/api/acl/grant"
+REVOKE_URL = f"{BASE}/api/acl/revoke"
+GRANTS_URL = f"{BASE}/api/acl/grants"
+DOWNLOAD_URL = (BASE + "/api/download/{file_id}").format
+
+
 def test_full_workflow():
     print("\n" + "="*80)
     print("END-TO-END TEST: Smart Contract ACL with Signed Device Auth")
     print("="*80)
     
     # Create two client sessions
-    alice_sess = requests.Session()
-    bob_sess = requests.Session()
+    alice_sess = new_session()
+    bob_sess = new_session()
     
     # Step 1: Login
     print("\n[STEP 1] Alice & Bob Login")
     print("-" * 80)
     
-    r = alice_sess.post(f"{BASE}/api/login", json={"user_id": "alice_e2e"})
+    # Independent requests on separate sessions, so both run at once
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        alice_login = ex.submit(post_json, alice_sess, LOGIN_URL, {"user_id": "alice_e2e"})
+        bob_login = ex.submit(post_json, bob_sess, LOGIN_URL, {"user_id": "bob_e2e"})
+    
+    r = alice_login.result()
     assert r.status_code == 200, f"Alice login failed: {r.text}"
-    print(f"  OK - Alice logged in. Chain has {r.json().get('blocks')} blocks")
+    print(f"  OK - Alice logged in. Chain has {read_json(r).get('blocks')} blocks")
     
-    r = bob_sess.post(f"{BASE}/api/login", json={"user_id": "bob_e2e"})
+    r = bob_login.result()
     assert r.status_code == 200, f"Bob login failed: {r.text}"
-    print(f"  OK - Bob logged in. Chain has {r.json().get('blocks')} blocks")
+    print(f"  OK - Bob logged in. Chain has {read_json(r).get('blocks')} blocks")
     
     # Step 2: Register devices
     print("\n[STEP 2] Register Devices with Ed25519 Public Keys")
     print("-" * 80)
     
-    alice_device_id = f"alice_device_{int(time.time())}"
-    bob_device_id = f"bob_device_{int(time.time())}"
+    now = int(time.time())
+    alice_device_id = f"alice_device_{now}"
+    bob_device_id = f"bob_device_{now}"
     
     if HAS_NACL:
-        # Generate keypairs
-        alice_key = SigningKey.generate()
-        bob_key = SigningKey.generate()
-        alice_pubkey = alice_key.verify_key.encode(encoder=Base64Encoder).decode('utf-8')
-        bob_pubkey = bob_key.verify_key.encode(encoder=Base64Encoder).decode('utf-8')
+        # Keypairs built at import from fixed seeds
+        alice_key, alice_pubkey = ALICE_KEY, ALICE_PUB_B64
+        bob_key, bob_pubkey = BOB_KEY, BOB_PUB_B64
+        
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            alice_reg = ex.submit(post_json, alice_sess, REGISTER_DEVICE_URL, {
+                "device_id": alice_device_id,
+                "device_public_key": alice_pubkey
+            })
+            bob_reg = ex.submit(post_json, bob_sess, REGISTER_DEVICE_URL, {
+                "device_id": bob_device_id,
+                "device_public_key": bob_pubkey
+            })
         
-        r = alice_sess.post(f"{BASE}/api/acl/register_device", json={
-            "device_id": alice_device_id,
-            "device_public_key": alice_pubkey
-        })
+        r = alice_reg.result()
         assert r.status_code == 200, f"Alice device register failed: {r.text}"
         print(f"  OK - Alice registered device: {alice_device_id}")
         
-        r = bob_sess.post(f"{BASE}/api/acl/register_device", json={
-            "device_id": bob_device_id,
-            "device_public_key": bob_pubkey
-        })
+        r = bob_reg.result()
         assert r.status_code == 200, f"Bob device register failed: {r.text}"
         print(f"  OK - Bob registered device: {bob_device_id}")
     else:
         # Fallback without signing
-        r = alice_sess.post(f"{BASE}/api/acl/register_device", json={"device_id": alice_device_id})
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            alice_reg = ex.submit(post_json, alice_sess, REGISTER_DEVICE_URL, {"device_id": alice_device_id})
+            bob_reg = ex.submit(post_json, bob_sess, REGISTER_DEVICE_URL, {"device_id": bob_device_id})
+        
+        r = alice_reg.result()
         assert r.status_code == 200
         print(f"  OK - Alice registered device (no signing)")
         
-        r = bob_sess.post(f"{BASE}/api/acl/register_device", json={"device_id": bob_device_id})
+        r = bob_reg.result()
         assert r.status_code == 200
         print(f"  OK - Bob registered device (no signing)")
     
@@ -93,16 +119,19 @@ def test_full_workflow():
     print("-" * 80)
     
     test_file = Path("test_e2e_file.txt")
-    test_file.write_text(f"Confidential data from Alice at {time.time()}")
+    payload = f"Confidential data from Alice at {time.time()}".encode('utf-8')
+    test_file.write_bytes(payload)
+    test_file_sha256 = hashlib.sha256(payload).hexdigest()
     
     with open(test_file, 'rb') as f:
-        files = {'file': f}
-        r = alice_sess.post(f"{BASE}/api/upload", files=files)
+        files = {'file': (test_file.name, f, 'application/octet-stream')}
+        r = alice_sess.post(UPLOAD_URL, files=files)
     
     assert r.status_code == 200, f"Upload failed: {r.text}"
-    file_id = r.json()['file_id']
+    data = read_json(r)
+    file_id = data['file_id']
     print(f"  OK - File uploaded with ID: {file_id}")
-    print(f"       Block ID: {r.json().get('block_id')}")
+    print(f"       Block ID: {data.get('block_id')}")
     
     # Step 4: Grant access on-chain
     print("\n[STEP 4] Alice Grants On-Chain Access to Bob (device-restricted)")
@@ -111,15 +140,16 @@ def test_full_workflow():
     # Use username instead of address - server will look it up
     bob_username = "bob"
     
-    r = alice_sess.post(f"{BASE}/api/acl/grant", json={
+    r = post_json(alice_sess, GRANT_URL, {
         "file_id": file_id,
         "username": bob_username,  # Use username instead of eth address
         "device_ids": [bob_device_id],
         "expiry": 0
     })
     assert r.status_code == 200, f"Grant failed: {r.text}"
-    tx = r.json()['tx']
-    granted_to = r.json().get('granted_to')
+    data = read_json(r)
+    tx = data['tx']
+    granted_to = data.get('granted_to')
     print(f"  OK - Access granted on-chain")
     print(f"       Tx: {tx[:16]}...")
     print(f"       Granted to: {granted_to}")
@@ -128,9 +158,9 @@ def test_full_workflow():
     print("\n[STEP 5] Verify Grants are Visible On-Chain")
     print("-" * 80)
     
-    r = alice_sess.get(f"{BASE}/api/acl/grants", params={"file_id": file_id})
+    r = alice_sess.get(GRANTS_URL, params={"file_id": file_id})
     assert r.status_code == 200, f"Get grants failed: {r.text}"
-    grants = r.json().get('grants', [])
+    grants = read_json(r).get('grants', [])
     print(f"  OK - Found {len(grants)} grant(s)")
     for grant in grants:
         print(f"       User: {grant['user']}")
@@ -143,25 +173,32 @@ def test_full_workflow():
     
     if HAS_NACL:
         # Alice creates signed request for her own file
-        timestamp = int(time.time())
-        message = f"{file_id}:alice_e2e:{timestamp}"
-        signed = alice_key.sign(message.encode('utf-8'))
-        signature_b64 = Base64Encoder.encode(signed.signature).decode('utf-8')
+        timestamp, signature = sign_request(alice_key, file_id, 'alice_e2e')
         
-        # Properly encode URL parameters
+        # Signature and key go as hex headers (the server's base64-free path);
+        # Step 8 covers the base64 query parameter form
         params = {
             'user_id': 'alice_e2e',
-            'device_signature': signature_b64,
-            'device_public_key': alice_pubkey,
             'timestamp': str(timestamp)
         }
-        url = f"{BASE}/api/download/{file_id}?{urlencode(params)}"
-        
-        r = requests.get(url)
-        assert r.status_code == 200, f"Download failed ({r.status_code}): {r.text[:200]}"
-        content = r.text
+        headers = {
+            'X-Sig-Encoding': 'hex',
+            'X-Device-Sig': signature.hex(),
+            'X-Device-Pub': ALICE_PUB_HEX
+        }
+        # Stream the body, hashing as it arrives instead of buffering it
+        with alice_sess.get(DOWNLOAD_URL(file_id=file_id), params=params, headers=headers, stream=True) as r:
+            assert r.status_code == 200, f"Download failed ({r.status_code}): {r.text[:200]}"
+            digest = hashlib.sha256()
+            preview = b""
+            for chunk in r.iter_content(chunk_size=65536):
+                if len(preview) < 50:
+                    preview += chunk[:50 - len(preview)]
+                digest.update(chunk)
+        assert digest.hexdigest() == test_file_sha256, "Downloaded content does not match upload"
         print(f"  OK - File downloaded successfully by owner")
-        print(f"       Content preview: {content[:50]}...")
+        print(f"       Content preview: {preview.decode('utf-8', 'replace')}...")
+        print(f"       Content SHA-256 matches upload")
         print(f"       Signature verified on download")
     else:
         print(f"  SKIPPED - PyNaCl not available for signing")
@@ -170,20 +207,21 @@ def test_full_workflow():
     print("\n[STEP 7] Alice Revokes Bob's Access")
     print("-" * 80)
     
-    r = alice_sess.post(f"{BASE}/api/acl/revoke", json={
+    r = post_json(alice_sess, REVOKE_URL, {
         "file_id": file_id,
         "username": bob_username  # Use username instead of eth address
     })
     assert r.status_code == 200, f"Revoke failed: {r.text}"
-    tx = r.json()['tx']
-    revoked_from = r.json().get('revoked_from')
+    data = read_json(r)
+    tx = data['tx']
+    revoked_from = data.get('revoked_from')
     print(f"  OK - Access revoked on-chain")
     print(f"       Tx: {tx[:16]}...")
     print(f"       Revoked from: {revoked_from}")
     
     # Verify revocation in grants list
-    r = alice_sess.get(f"{BASE}/api/acl/grants", params={"file_id": file_id})
-    grants = r.json().get('grants', [])
+    r = alice_sess.get(GRANTS_URL, params={"file_id": file_id})
+    grants = read_json(r).get('grants', [])
     revoked_count = sum(1 for g in grants if g.get('revoked', False))
     print(f"       Grants now showing {revoked_count} as revoked")
     
@@ -193,24 +231,20 @@ def test_full_workflow():
     
     if HAS_NACL:
         # Try same signed request
-        timestamp = int(time.time())
-        message = f"{file_id}:bob_e2e:{timestamp}"
-        signed = bob_key.sign(message.encode('utf-8'))
-        signature_b64 = Base64Encoder.encode(signed.signature).decode('utf-8')
+        timestamp, signature = sign_request(bob_key, file_id, 'bob_e2e')
+        signature_b64 = base64.b64encode(signature).decode('utf-8')
         
-        # Properly encode URL parameters
+        # Query parameters (requests encodes them)
         params = {
             'user_id': 'bob_e2e',
             'device_signature': signature_b64,
             'device_public_key': bob_pubkey,
             'timestamp': str(timestamp)
         }
-        url = f"{BASE}/api/download/{file_id}?{urlencode(params)}"
-        
-        r = requests.get(url)
+        r = bob_sess.get(DOWNLOAD_URL(file_id=file_id), params=params)
         if r.status_code == 403:
             print(f"  OK - Access correctly denied (403)")
-            print(f"       Message: {r.json().get('error', 'Access denied by ACL')}")
+            print(f"       Message: {read_json(r).get('error', 'Access denied by ACL')}")
         else:
             print(f"  WARNING - Expected 403, got {r.status_code}")
     else:
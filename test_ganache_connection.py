@@ -5,6 +5,8 @@ Ganache Connection Diagnostic Tool
 Tests connection to Ganache and provides troubleshooting steps.
 """
 
+import errno
+import select
 import socket
 import time
 from web3 import Web3
@@ -24,6 +26,46 @@ def test_port_open(host, port, timeout=2):
         return False
 
 
+def test_ports_open(addresses, timeout=1):
+    """Probe several (host, port) pairs at once; returns the set that are open"""
+    in_progress = {errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, 'WSAEWOULDBLOCK', None)}
+    open_addresses = set()
+    pending = {}
+    try:
+        # Start every connect without waiting for any of them
+        for address in addresses:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            result = sock.connect_ex(address)
+            if result == 0:
+                open_addresses.add(address)
+                sock.close()
+            elif result in in_progress:
+                pending[sock] = address
+            else:
+                sock.close()
+        
+        # One shared timeout window: a socket becomes writable once its connect finishes
+        deadline = time.monotonic() + timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            socks = list(pending)
+            _, writable, failed = select.select([], socks, socks, remaining)
+            for sock in set(writable) | set(failed):
+                address = pending.pop(sock)
+                if sock not in failed and sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    open_addresses.add(address)
+                sock.close()
+    except Exception as e:
+        print(f"Error testing ports: {e}")
+    finally:
+        for sock in pending:
+            sock.close()
+    return open_addresses
+
+
 def test_ganache_connection(ganache_url=None):
     """Test connection to Ganache RPC server"""
     ganache_url = ganache_url or config.GANACHE_URL
@@ -105,11 +147,14 @@ def test_alternative_ports():
         ("http://127.0.0.1:9545", "Alternative Ganache port"),
     ]
     
-    for url, desc in ports:
-        host = url.replace("http://", "").split(":")[0]
-        port = int(url.split(":")[-1])
-        
-        if test_port_open(host, port, timeout=1):
+    addresses = [
+        (url.replace("http://", "").split(":")[0], int(url.split(":")[-1]))
+        for url, _ in ports
+    ]
+    open_addresses = test_ports_open(addresses, timeout=1)
+    
+    for (url, desc), address in zip(ports, addresses):
+        if address in open_addresses:
             print(f"✅ {desc} - {url} is OPEN")
             try:
                 w3 = Web3(Web3.HTTPProvider(url))
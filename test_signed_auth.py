@@ -8,15 +8,25 @@ This script tests the core functionality:
 3. ACL enforcement
 """
 
-import json
 import base64
 import time
 
-# Import required modules
-import requests
+from api_test_client import new_session, post_json, read_json, seeded_key
 
 BASE_URL = "http://localhost:5000"
 
+# Endpoint URLs, built once
+LOGIN_URL = f"{BASE_URL}/api/login"
+REGISTER_DEVICE_URL = f"{BASE_URL}/api/acl/register_device"
+DEVICE_KEYS_URL = f"{BASE_URL}/api/acl/device_keys"
+DOWNLOAD_URL = (BASE_URL + "/api/download/{file_id}").format
+
+# Shared by the tests that don't need their own login
+_SESSION = new_session()
+
+# Test device keypair from a fixed seed
+_TEST_KEY, _TEST_PUB_B64 = seeded_key(0x03)
+
 def test_device_registration_and_download():
     """Test device public key storage and signature verification"""
     
@@ -25,40 +35,36 @@ def test_device_registration_and_download():
     print("="*70)
     
     # Create a session
-    session = requests.Session()
+    session = new_session()
     
     # Step 1: Login
     print("\n[1] Login as alice...")
-    r = session.post(f"{BASE_URL}/api/login", json={"user_id": "alice_test"})
+    r = post_json(session, LOGIN_URL, {"user_id": "alice_test"})
     assert r.status_code == 200, f"Login failed: {r.text}"
-    print(f"   OK - Logged in. Blocks in blockchain: {r.json().get('blocks', 0)}")
+    print(f"   OK - Logged in. Blocks in blockchain: {read_json(r).get('blocks', 0)}")
     
     # Step 2: Register device with public key
     print("\n[2] Register device with public key...")
     device_public_key = base64.b64encode(b"test_public_key_32_bytes_12345678")
-    r = session.post(f"{BASE_URL}/api/acl/register_device", json={
+    r = post_json(session, REGISTER_DEVICE_URL, {
         "device_id": f"test_device_{int(time.time())}",
         "device_public_key": device_public_key.decode('utf-8')
     })
     
     assert r.status_code == 200, f"Register failed: {r.text}"
-    data = r.json()
+    data = read_json(r)
     print(f"   OK - Device registered: {data.get('device_id')}")
     print(f"   OK - Public key stored: {data.get('device_public_key')}")
     
     # Step 3: Verify device public keys are persisted
     print("\n[3] Verify device keys persisted...")
-    from pathlib import Path
-    keys_file = Path("data/device_public_keys.json")
-    if keys_file.exists():
-        with open(keys_file) as f:
-            keys = json.load(f)
-        user_device_key = [k for k in keys.keys() if "alice_test" in k and "test_device" in k]
-        assert len(user_device_key) > 0, "Device key not found in storage"
-        print(f"   OK - Found {len(user_device_key)} device key(s) in storage")
-        print(f"   OK - Device key: {user_device_key[0]}")
-    else:
-        print("   NOTE - device_public_keys.json not found (will be created on first registration)")
+    r = session.get(DEVICE_KEYS_URL, params={"user": "alice_test"})
+    assert r.status_code == 200, f"Device key lookup failed: {r.text}"
+    keys = read_json(r)
+    user_device_key = [k for k in keys if "test_device" in k]
+    assert len(user_device_key) > 0, "Device key not found in storage"
+    print(f"   OK - Found {len(user_device_key)} device key(s) in storage")
+    print(f"   OK - Device key: {user_device_key[0]}")
     
     print("\nTEST 1 PASSED - Device registration and key storage working\n")
 
@@ -72,14 +78,12 @@ def test_signature_verification_helpers():
     
     # Import backend verification function
     try:
-        from step15_network_server import verify_device_signature
-        import nacl.signing
+        from step15_network_server import verify_device_signature, verify_device_signatures_batch
         from nacl.encoding import Base64Encoder
         
-        # Create test keypair
-        signing_key = nacl.signing.SigningKey.generate()
-        verify_key = signing_key.verify_key
-        public_key_b64 = verify_key.encode(encoder=Base64Encoder).decode('utf-8')
+        # Test keypair (fixed seed, built at import)
+        signing_key = _TEST_KEY
+        public_key_b64 = _TEST_PUB_B64
         
         # Create test message and signature
         message = "test_file_id:test_user:1234567890"
@@ -124,6 +128,16 @@ def test_signature_verification_helpers():
         assert not is_valid, "Signature for modified message was not rejected"
         print(f"   OK - Modified message rejected: {error}")
         
+        # Test batch verification matches the single-signature results
+        print("\n[4] Verify a batch of signatures in one call...")
+        results = verify_device_signatures_batch([
+            ("test_user", "test_device", message, signature_b64, public_key_b64),
+            ("test_user", "test_device", message, bad_signature, public_key_b64),
+            ("test_user", "test_device", modified_message, signature_b64, public_key_b64),
+        ])
+        assert [ok for ok, _ in results] == [True, False, False], f"Unexpected batch results: {results}"
+        print("   OK - Batch results match individual verification")
+        
         print("\nTEST 2 PASSED - Signature verification working correctly\n")
         
     except ImportError as e:
@@ -138,23 +152,23 @@ def test_api_endpoints():
     print("TEST 3: API Endpoint Validation")
     print("="*70)
     
-    session = requests.Session()
+    session = _SESSION
     
     # Test register_device endpoint exists
     print("\n[1] Check /api/acl/register_device endpoint...")
-    r = session.post(f"{BASE_URL}/api/acl/register_device", json={})
+    r = post_json(session, REGISTER_DEVICE_URL, {})
     # Should return 401 (not logged in) not 404 (endpoint not found)
     assert r.status_code != 404, "Endpoint not found"
     print(f"   OK - Endpoint exists (status: {r.status_code})")
     
     # Test download endpoint with device params
-        print("\n[2] Check /api/download endpoint accepts device parameters...")
-        r = requests.get(f"{BASE_URL}/api/download/nonexistent_file?user_id=test&device_signature=sig&device_public_key=key&timestamp=123")
-        # Could be 404 (file not found) or 401 (no user_id in session), both are OK
-        # Should NOT be an error from missing device parameters
-        assert r.status_code in [401, 404, 400, 403], f"Unexpected status: {r.status_code}"
-        print(f"   OK - Endpoint exists and accepts device parameters")
-        print(f"       (returned {r.status_code} - expected for missing file)")
+    print("\n[2] Check /api/download endpoint accepts device parameters...")
+    r = session.get(DOWNLOAD_URL(file_id="nonexistent_file") + "?user_id=test&device_signature=sig&device_public_key=key&timestamp=123")
+    # Could be 404 (file not found) or 401 (no user_id in session), both are OK
+    # Should NOT be an error from missing device parameters
+    assert r.status_code in [401, 404, 400, 403], f"Unexpected status: {r.status_code}"
+    print(f"   OK - Endpoint exists and accepts device parameters")
+    print(f"       (returned {r.status_code} - expected for missing file)")
     
     print("\nTEST 3 PASSED - API endpoints available\n")
 
@@ -7,9 +7,22 @@ Tests if the contract stored in contract_info.json is actually deployed on Ganac
 
 import json
 from pathlib import Path
+import requests
 import config
 from web3 import Web3
 
+# One HTTP session and Web3 client for every check in this script
+_SESSION = requests.Session()
+_W3 = None
+
+
+def _get_web3():
+    """Return the shared Web3 client, creating it on first use"""
+    global _W3
+    if _W3 is None:
+        _W3 = Web3(Web3.HTTPProvider(config.GANACHE_URL, session=_SESSION))
+    return _W3
+
 
 def verify_contract():
     """Verify if contract is deployed on Ganache"""
@@ -20,7 +33,7 @@ def verify_contract():
     # Step 1: Connect to Ganache
     print("\n[1/4] Connecting to Ganache...")
     try:
-        w3 = Web3(Web3.HTTPProvider(config.GANACHE_URL))
+        w3 = _get_web3()
         if w3.is_connected():
             print("✅ Connected to Ganache")
         else: